@@ -0,0 +1,321 @@
+import io
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+from xml.sax.saxutils import quoteattr
+
+API_VERSION = '3.19'
+SITE_ID = 'bench-site'
+
+WORKBOOK_TWB = """<?xml version='1.0' encoding='utf-8' ?>
+<workbook source-build='2020.1' version='18.1' xmlns:user='http://www.tableausoftware.com/xml/user'>
+  <datasources>
+    <datasource caption='Sales' inline='true' name='sales.1' version='18.1'>
+      <connection class='federated'>
+        <named-connections>
+          <named-connection caption='%(datasource)s' name='sqlproxy.1'>
+            <connection class='sqlproxy' dbname='%(datasource)s' server='localhost' username='' port='8060' />
+          </named-connection>
+        </named-connections>
+      </connection>
+      %(columns)s
+    </datasource>
+  </datasources>
+  <worksheets>
+    <worksheet name='Sheet 1'>
+      <table>
+        <view>
+          <datasources>
+            <datasource caption='Sales' name='sales.1' />
+          </datasources>
+          <datasource-dependencies datasource='sales.1'>
+            <column datatype='real' name='[Field 0]' role='measure' type='quantitative' />
+          </datasource-dependencies>
+        </view>
+      </table>
+    </worksheet>
+  </worksheets>
+</workbook>
+"""
+
+DATASOURCE_TDS = """<?xml version='1.0' encoding='utf-8' ?>
+<datasource formatted-name='%(name)s' inline='true' version='18.1'>
+  <connection class='postgres' dbname='db' server='db-host' username='user' port='5432' />
+  %(columns)s
+</datasource>
+"""
+
+
+def _pdf_document(pages):
+    """
+    minimal valid pdf with given number of blank pages
+    """
+    objects = [b"<< /Type /Catalog /Pages 2 0 R >>",
+               b"<< /Type /Pages /Kids [%s] /Count %d >>" % (
+                   b" ".join(b"%d 0 R" % (3 + i) for i in range(pages)), pages)]
+    objects += [b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] >>"] * pages
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = list()
+    for number, obj in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(b"%d 0 obj\n%s\nendobj\n" % (number, obj))
+    xref = out.tell()
+    out.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+    for offset in offsets:
+        out.write(b"%010d 00000 n \n" % offset)
+    out.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return out.getvalue()
+
+
+def _png_image(width, height):
+    from PIL import Image
+    out = io.BytesIO()
+    Image.new('RGB', (width, height), (255, 255, 255)).save(out, format='PNG')
+    return out.getvalue()
+
+
+class MockTableauServer():
+    """
+    local stand in for the tableau rest api endpoints used by pytableau, serving generated workbooks, datasources,
+    views and refresh jobs. every request is delayed by latency seconds
+    """
+
+    def __init__(self, latency=0.0, workbooks=50, datasources=50, views_per_workbook=3, pdf_pages=1,
+                 png_size=(800, 600), csv_rows=1000, fields=20, job_duration=1.0, scheduled_workbooks=5, port=0):
+        """
+
+        :param latency: seconds added to every request
+        :param workbooks: number of workbooks
+        :param datasources: number of datasources
+        :param views_per_workbook:
+        :param pdf_pages: pages of each view pdf
+        :param png_size: (width, height) of each view image
+        :param csv_rows: rows of each view csv
+        :param fields: number of columns of each downloaded workbook and datasource
+        :param job_duration: seconds a refresh job runs
+        :param scheduled_workbooks: number of workbooks tagged 'scheduledReport' and 'Daily:to:reports@mail.com'
+        :param port: 0 to pick a free port
+        """
+        self.latency = latency
+        self.views_per_workbook = views_per_workbook
+        self.job_duration = job_duration
+        self.requests = 0
+        self._lock = threading.Lock()
+        self.jobs = dict()
+        self.created_at = datetime(2020, 1, 1, tzinfo=timezone.utc)
+        self.workbooks = [{'id': 'wb-%s' % i, 'name': 'workbook %s' % i, 'project': 'project %s' % (i % 5),
+                           'datasource': 'datasource %s' % (i % max(datasources, 1)),
+                           'tags': ['scheduledReport', 'Daily:to:reports@mail.com'] if i < scheduled_workbooks else []}
+                          for i in range(workbooks)]
+        self.datasources = [{'id': 'ds-%s' % i, 'name': 'datasource %s' % i, 'project': 'project %s' % (i % 5)}
+                            for i in range(datasources)]
+        self.pdf = _pdf_document(pdf_pages)
+        self.png = _png_image(*png_size)
+        self.csv = ("Region,Amount\n" + "".join("region %s,%s\n" % (i % 10, i) for i in range(csv_rows))).encode()
+        self.columns = "\n".join("<column datatype='real' name='[Field %s]' role='measure' type='quantitative' />" % i
+                                 for i in range(fields))
+        self._httpd = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def address(self):
+        return "http://127.0.0.1:%s" % self._httpd.server_address[1]
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def _handler_class(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def log_message(self, format, *args):
+                pass
+
+            def do_GET(self):
+                server._handle(self, 'GET')
+
+            def do_POST(self):
+                server._handle(self, 'POST')
+
+            def do_PUT(self):
+                server._handle(self, 'PUT')
+
+        return Handler
+
+    @staticmethod
+    def _send(handler, body, content_type='application/xml', status=200, headers=None):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        handler.send_response(status)
+        handler.send_header('Content-Type', content_type)
+        handler.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or dict()).items():
+            handler.send_header(key, value)
+        handler.end_headers()
+        handler.wfile.write(body)
+
+    @staticmethod
+    def _response(body):
+        return '<?xml version="1.0" encoding="UTF-8"?><tsResponse xmlns="http://tableau.com/api">%s</tsResponse>' % body
+
+    @staticmethod
+    def _filter(items, query):
+        for item_filter in query.get('filter', []):
+            for field, operator, value in re.findall(r'(\w+):(\w+):(\[[^\]]*\]|[^,]*)', item_filter):
+                key = {'name': 'name', 'projectName': 'project', 'tags': 'tags'}.get(field)
+                if key is None:
+                    continue
+                if operator == 'in':
+                    values = value.strip('[]').split(',')
+                    items = [item for item in items if item.get(key) in values]
+                elif operator == 'eq' and key == 'tags':
+                    items = [item for item in items if value in item.get(key, [])]
+                elif operator == 'eq':
+                    items = [item for item in items if item.get(key) == value]
+        return items
+
+    def _page(self, items, query, tag, render):
+        page_size = int(query.get('pageSize', ['100'])[0])
+        page_number = int(query.get('pageNumber', ['1'])[0])
+        items = self._filter(items, query)
+        page = items[(page_number - 1) * page_size:page_number * page_size]
+        return self._response('<pagination pageNumber="%s" pageSize="%s" totalAvailable="%s"/><%ss>%s</%ss>' % (
+            page_number, page_size, len(items), tag, "".join(render(item) for item in page), tag))
+
+    def _workbook_xml(self, wb):
+        return '<workbook id="%s" name=%s contentUrl="%s" updatedAt="%s" createdAt="%s"><project id="p" name=%s/>' \
+               '<owner id="owner"/><tags>%s</tags></workbook>' % (
+                   wb['id'], quoteattr(wb['name']), wb['id'], self._time(self.created_at), self._time(self.created_at),
+                   quoteattr(wb['project']), "".join('<tag label=%s/>' % quoteattr(tag) for tag in wb['tags']))
+
+    def _datasource_xml(self, ds):
+        return '<datasource id="%s" name=%s contentUrl="%s" type="postgres" updatedAt="%s" createdAt="%s" ' \
+               'hasExtracts="true"><project id="p" name=%s/><owner id="owner"/><tags/></datasource>' % (
+                   ds['id'], quoteattr(ds['name']), ds['id'], self._time(self.created_at),
+                   self._time(self.created_at), quoteattr(ds['project']))
+
+    @staticmethod
+    def _time(value):
+        return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+    def _job_xml(self, job):
+        now = datetime.now(timezone.utc)
+        completed = now >= job['completes_at']
+        return '<job id="%s" mode="Asynchronous" type="RefreshExtract" createdAt="%s" startedAt="%s"%s progress="%s">' \
+               '</job>' % (job['id'], self._time(job['created_at']), self._time(job['created_at']),
+                           ' completedAt="%s" finishCode="0"' % self._time(job['completes_at']) if completed else '',
+                           100 if completed else 50)
+
+    def _handle(self, handler, method):
+        if self.latency:
+            time.sleep(self.latency)
+        with self._lock:
+            self.requests += 1
+        if method in ('POST', 'PUT'):
+            length = int(handler.headers.get('Content-Length') or 0)
+            if length:
+                handler.rfile.read(length)
+        url = urlparse(handler.path)
+        query = parse_qs(url.query)
+        path = unquote(url.path)
+        parts = [part for part in re.sub(r'^/api/[^/]+/', '', path).split('/') if part]
+        if parts and parts[0] == 'sites' and len(parts) > 1:
+            parts = parts[2:]
+
+        if parts == ['serverInfo']:
+            return self._send(handler, self._response(
+                '<serverInfo><productVersion build="mock">2023.1</productVersion>'
+                '<restApiVersion>%s</restApiVersion></serverInfo>' % API_VERSION))
+        if parts == ['auth', 'signin']:
+            return self._send(handler, self._response(
+                '<credentials token="%s"><site id="%s" contentUrl=""/><user id="bench-user"/></credentials>' % (
+                    uuid.uuid4().hex, SITE_ID)))
+        if parts == ['auth', 'signout']:
+            return self._send(handler, '', status=204)
+
+        if parts == ['workbooks']:
+            return self._send(handler, self._page(self.workbooks, query, 'workbook', self._workbook_xml))
+        if parts == ['datasources']:
+            return self._send(handler, self._page(self.datasources, query, 'datasource', self._datasource_xml))
+        if parts == ['projects']:
+            projects = [{'id': 'p%s' % i, 'name': 'project %s' % i} for i in range(5)]
+            return self._send(handler, self._page(projects, query, 'project', lambda p: '<project id="%s" name=%s/>' % (
+                p['id'], quoteattr(p['name']))))
+
+        if len(parts) >= 2 and parts[0] in ('workbooks', 'datasources'):
+            items = self.workbooks if parts[0] == 'workbooks' else self.datasources
+            item = next((item for item in items if item['id'] == parts[1]), None)
+            if item is None:
+                return self._send(handler, self._response('<error code="404000"/>'), status=404)
+            if len(parts) == 2:
+                render = self._workbook_xml if parts[0] == 'workbooks' else self._datasource_xml
+                return self._send(handler, self._response(render(item)))
+            if parts[2] == 'views':
+                return self._send(handler, self._response('<views>%s</views>' % "".join(
+                    '<view id="%s-v%s" name="view %s" contentUrl="%s/sheets/view%s"><workbook id="%s"/></view>' % (
+                        item['id'], i, i, item['id'], i, item['id']) for i in range(self.views_per_workbook))))
+            if parts[2] == 'connections':
+                return self._send(handler, self._response(
+                    '<connections><connection id="%s-c" type="sqlproxy" serverAddress="localhost" serverPort="8060" '
+                    'userName=""><datasource id="ds" name=%s/></connection></connections>' % (
+                        item['id'], quoteattr(item.get('datasource', item['name'])))))
+            if parts[2] == 'content':
+                if parts[0] == 'workbooks':
+                    body, file_name = WORKBOOK_TWB % {'datasource': item['datasource'], 'columns': self.columns}, \
+                                      '%s.twb' % item['name']
+                else:
+                    body, file_name = DATASOURCE_TDS % {'name': item['name'], 'columns': self.columns}, \
+                                      '%s.tds' % item['name']
+                return self._send(handler, body, content_type='application/octet-stream',
+                                  headers={'Content-Disposition': 'attachment; filename="%s"' % file_name})
+            if parts[2] == 'refresh':
+                now = datetime.now(timezone.utc)
+                job = {'id': uuid.uuid4().hex, 'created_at': now,
+                       'completes_at': now + timedelta(seconds=self.job_duration)}
+                with self._lock:
+                    self.jobs[job['id']] = job
+                return self._send(handler, self._response(self._job_xml(job)), status=202)
+
+        if len(parts) == 3 and parts[0] == 'views':
+            if parts[2] == 'pdf':
+                return self._send(handler, self.pdf, content_type='application/pdf')
+            if parts[2] == 'image':
+                return self._send(handler, self.png, content_type='image/png')
+            if parts[2] == 'data':
+                return self._send(handler, self.csv, content_type='text/csv')
+
+        if parts == ['jobs']:
+            now = datetime.now(timezone.utc)
+            running = [job for job in self.jobs.values() if now < job['completes_at']]
+            if not any('status:eq:InProgress' in value for value in query.get('filter', [])):
+                running = list(self.jobs.values())
+            return self._send(handler, self._response(
+                '<pagination pageNumber="1" pageSize="%s" totalAvailable="%s"/><backgroundJobs>%s</backgroundJobs>' % (
+                    query.get('pageSize', ['100'])[0], len(running), "".join(
+                        '<backgroundJob id="%s" status="InProgress" createdAt="%s" jobType="refresh_extracts"/>' % (
+                            job['id'], self._time(job['created_at'])) for job in running[:1]))))
+        if len(parts) == 2 and parts[0] == 'jobs' and parts[1] in self.jobs:
+            return self._send(handler, self._response(self._job_xml(self.jobs[parts[1]])))
+
+        return self._send(handler, self._response('<error code="404000"><summary>%s</summary></error>' % path),
+                          status=404)
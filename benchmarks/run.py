@@ -0,0 +1,160 @@
+"""
+run pytableau benchmarks against a local MockTableauServer
+
+    python -m benchmarks.run --latency 0.05 --workbooks 100 --repeat 3
+"""
+import argparse
+import json
+import logging
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+from benchmarks.mock_server import MockTableauServer
+from pytableau import PyTableau, PyTableauReportScheduler, PyTableauMailer, PyTableauSmtpStub, PyTableauJobTracker, \
+    log
+
+
+class Benchmark():
+    """
+    set up a signed in PyTableau against the mock server and time named cases
+    """
+
+    def __init__(self, server: MockTableauServer, max_workers=4, poll_interval=0.05):
+        self.server = server
+        self.max_workers = max_workers
+        self.tableau = PyTableau(server.address, 'bench', 'bench', '')
+        # fixed polling interval without jitter so refresh timings follow the job duration
+        self.job_tracker = PyTableauJobTracker(self.tableau.server, min_interval=poll_interval,
+                                               max_interval=poll_interval, jitter=0)
+        self.workbook = self.tableau.get_workbook_by_name('workbook 0')
+        self.work_dir = tempfile.mkdtemp()
+        self.workbooks_dir = tempfile.mkdtemp(dir=self.work_dir)
+        self.tableau.download_all_workbooks(self.workbooks_dir, max_workers=max_workers)
+
+    def close(self):
+        shutil.rmtree(self.work_dir, ignore_errors=True)
+
+    @contextmanager
+    def _dest_dir(self):
+        dest_dir = tempfile.mkdtemp(dir=self.work_dir)
+        try:
+            yield dest_dir
+        finally:
+            shutil.rmtree(dest_dir, ignore_errors=True)
+
+    def sign_in(self):
+        PyTableau(self.server.address, 'bench', 'bench', '')
+
+    def list_workbooks(self):
+        self.tableau.get_items_by_names(['workbook %s' % i for i in range(len(self.server.workbooks))])
+
+    def download_workbook_pdf(self):
+        with self._dest_dir() as dest_dir:
+            self.tableau.download_workbook_pdf(self.workbook, dest_dir, max_workers=self.max_workers)
+
+    def download_workbook_png(self):
+        with self._dest_dir() as dest_dir:
+            self.tableau.download_workbook_png(self.workbook, dest_dir, max_workers=self.max_workers)
+
+    def download_workbook_csv(self):
+        with self._dest_dir() as dest_dir:
+            self.tableau.download_workbook_csv(self.workbook, dest_dir, max_workers=self.max_workers)
+
+    def download_all_workbooks(self):
+        with self._dest_dir() as dest_dir:
+            self.tableau.download_all_workbooks(dest_dir, max_workers=self.max_workers)
+
+    def download_all_datasources(self):
+        with self._dest_dir() as dest_dir:
+            self.tableau.download_all_datasources(dest_dir, max_workers=self.max_workers)
+
+    def get_all_workbook_fields(self):
+        self.tableau.get_all_workbook_fields(self.workbooks_dir)
+
+    def refresh_extracts(self):
+        self.tableau.refresh_extracts(['datasource 0', 'datasource 1', 'workbook 0'], synchronous=True,
+                                      job_tracker=self.job_tracker)
+
+    def send_scheduled_reports(self):
+        outbox = list()
+        mailer = PyTableauMailer(lambda: PyTableauSmtpStub(user='reports@mail.com', outbox=outbox),
+                                 pool_size=self.max_workers)
+        scheduler = PyTableauReportScheduler(self.tableau, smtp_server=None, schedule_tag='scheduledReport',
+                                             mailer=mailer)
+        scheduler.send_schedule(send_from='reports@mail.com', schedule='Daily')
+        mailer.close()
+
+
+CASES = ['sign_in', 'list_workbooks', 'download_workbook_pdf', 'download_workbook_png', 'download_workbook_csv',
+         'download_all_workbooks', 'download_all_datasources', 'get_all_workbook_fields', 'refresh_extracts',
+         'send_scheduled_reports']
+
+
+def run(server: MockTableauServer, cases=None, repeat=3, max_workers=4, poll_interval=0.05) -> list:
+    """
+
+    :param server: started MockTableauServer
+    :param cases: names of Benchmark methods, all CASES by default
+    :param repeat: runs per case
+    :param max_workers: max_workers passed to the benchmarked methods
+    :param poll_interval: seconds between refresh job status checks
+    :return: list of result dicts with case, min, median, max seconds and requests per run
+    """
+    cases = cases or CASES
+    benchmark = Benchmark(server, max_workers=max_workers, poll_interval=poll_interval)
+    results = list()
+    try:
+        for case in cases:
+            timings = list()
+            requests = server.requests
+            for _ in range(repeat):
+                start = time.perf_counter()
+                getattr(benchmark, case)()
+                timings.append(time.perf_counter() - start)
+            results.append({'case': case, 'min': min(timings), 'median': statistics.median(timings),
+                            'max': max(timings), 'requests': (server.requests - requests) // repeat})
+    finally:
+        benchmark.close()
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="pytableau benchmarks against a local mock Tableau REST server")
+    parser.add_argument('--latency', type=float, default=0.01, help="seconds added to every request")
+    parser.add_argument('--workbooks', type=int, default=50)
+    parser.add_argument('--datasources', type=int, default=50)
+    parser.add_argument('--views', type=int, default=3, help="views per workbook")
+    parser.add_argument('--pdf-pages', type=int, default=1, help="pages of each view pdf")
+    parser.add_argument('--png-size', type=int, nargs=2, default=(800, 600), metavar=('WIDTH', 'HEIGHT'))
+    parser.add_argument('--csv-rows', type=int, default=1000, help="rows of each view csv")
+    parser.add_argument('--fields', type=int, default=20, help="fields of each workbook and datasource")
+    parser.add_argument('--job-duration', type=float, default=1.0, help="seconds a refresh job runs")
+    parser.add_argument('--poll-interval', type=float, default=0.05, help="seconds between refresh job status checks")
+    parser.add_argument('--max-workers', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--case', action='append', choices=CASES, help="run only given cases")
+    parser.add_argument('--json', help="write results to given json file")
+    args = parser.parse_args(argv)
+
+    log.setLevel(logging.WARNING)
+    with MockTableauServer(latency=args.latency, workbooks=args.workbooks, datasources=args.datasources,
+                           views_per_workbook=args.views, pdf_pages=args.pdf_pages, png_size=tuple(args.png_size),
+                           csv_rows=args.csv_rows, fields=args.fields, job_duration=args.job_duration) as server:
+        results = run(server, cases=args.case or CASES, repeat=args.repeat, max_workers=args.max_workers,
+                      poll_interval=args.poll_interval)
+
+    print("%-26s %10s %10s %10s %9s" % ('case', 'min s', 'median s', 'max s', 'requests'))
+    for result in results:
+        print("%-26s %10.3f %10.3f %10.3f %9d" % (result['case'], result['min'], result['median'], result['max'],
+                                                   result['requests']))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({'args': vars(args), 'results': results}, f, indent=2)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
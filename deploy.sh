@@ -5,5 +5,5 @@ python3 --version
 python3 -m pip install coverage pylint pytest
 python3 -m compileall -f pytableau setup.py
 python3 -m coverage report -m ./pytableau/*.py setup.py
-python3 setup.py -q install --user --force
+python3 -m pip install --user --force-reinstall '.[all]'
 python3 -m pylint pytableau setup.py
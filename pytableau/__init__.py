@@ -1,13 +1,32 @@
 #! /usr/bin/env python
 # -*- coding: utf-8 -*-
+import asyncio
+import codecs
 import csv
+import functools
+import gzip
+import hashlib
+import importlib
+import io
+import itertools
+import json
 import logging
+import math
 import os
+import random
+import re
 import shutil
 import smtplib
+import socket
+import sqlite3
 import sys
 import tempfile
+import threading
 import time
+import zipfile
+from collections import OrderedDict
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait as futures_wait
 from datetime import datetime
 from email.mime.application import MIMEApplication
 from email.mime.multipart import MIMEMultipart
@@ -15,29 +34,220 @@ from email.mime.text import MIMEText
 from email.utils import formatdate
 from os.path import basename
 from pathlib import Path
-from smtpd import COMMASPACE
 from urllib.parse import quote_plus
 
-import pandas as pd
-import tableaudocumentapi
+import requests
 import tableauserverclient as TSC
-from PIL import Image
-from openpyxl import Workbook
 from tableauserverclient import ViewItem, WorkbookItem, DatasourceItem, ProjectItem, PDFRequestOptions, \
     ImageRequestOptions, CSVRequestOptions
 
-try:
-    import PyPDF3
-except ImportError:
-    raise Exception('Please `pip install PyPDF3` to use this module')
+# pandas, PIL, openpyxl, PyPDF3, tableaudocumentapi and pyarrow are imported on first use, see setup.py extras
+
+COMMASPACE = ', '
 
 log = logging.getLogger('PyTableau')
 log.setLevel(logging.INFO)
-handler = logging.StreamHandler(sys.stdout)
-handler.setLevel(logging.INFO)
-formatter = logging.Formatter('%(asctime)s - %(levelname)s - %(message)s')
-handler.setFormatter(formatter)
-log.addHandler(handler)
+log.addHandler(logging.NullHandler())
+
+
+class PyTableauMetrics():
+    """
+    thread safe registry of labeled counters and latency histograms. http calls of instrumented requests sessions are
+    recorded with their latency and bytes, pipeline stages with timer. span hooks are called for each timed stage, for
+    example to open OpenTelemetry spans. metrics are exported in prometheus text format
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+    # rest api ids, replaced in endpoint labels to keep the number of label values small
+    ID_PATTERN = re.compile(r'[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}')
+
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.enabled = True
+        # name -> labels tuple -> value or [bucket counts, sum, count]
+        self._counters = dict()
+        self._histograms = dict()
+        self._span_hooks = list()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _labels(labels: dict) -> tuple:
+        return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+    def inc(self, name, value=1, **labels):
+        """
+        add value to the counter
+
+        :param name:
+        :param value:
+        :param labels:
+        """
+        if not self.enabled:
+            return
+        key = self._labels(labels)
+        with self._lock:
+            counter = self._counters.setdefault(name, dict())
+            counter[key] = counter.get(key, 0) + value
+
+    def observe(self, name, value, **labels):
+        """
+        record value in the histogram
+
+        :param name:
+        :param value: seconds
+        :param labels:
+        """
+        if not self.enabled:
+            return
+        key = self._labels(labels)
+        with self._lock:
+            histogram = self._histograms.setdefault(name, dict()).setdefault(key, [[0] * len(self.buckets), 0.0, 0])
+            for i, bucket in enumerate(self.buckets):
+                if value <= bucket:
+                    histogram[0][i] += 1
+            histogram[1] += value
+            histogram[2] += 1
+
+    def value(self, name, **labels):
+        """
+
+        :return: counter value, or (count, sum) of the histogram
+        """
+        key = self._labels(labels)
+        with self._lock:
+            if name in self._histograms:
+                _, total, count = self._histograms[name].get(key, (None, 0.0, 0))
+                return count, total
+            return self._counters.get(name, dict()).get(key, 0)
+
+    def add_span_hook(self, hook):
+        """
+        :param hook: callable called with (stage name, labels dict) for each timed stage returning a context manager
+            entered while the stage runs, e.g.
+            lambda name, labels: tracer.start_as_current_span(name, attributes=labels)
+        """
+        self._span_hooks.append(hook)
+
+    @contextmanager
+    def timer(self, stage, **labels):
+        """
+        time the stage into pytableau_stage_seconds and count failures in pytableau_stage_errors_total
+
+        :param stage: list, render, merge, email ...
+        :param labels:
+        """
+        spans = list()
+        try:
+            for hook in self._span_hooks:
+                span = hook("pytableau.%s" % stage, dict(labels))
+                span.__enter__()
+                spans.append(span)
+        except Exception as e:
+            log.debug("Span hook failed %s" % str(e))
+        start = time.perf_counter()
+        error = None
+        try:
+            yield
+        except BaseException as e:
+            error = e
+            self.inc('pytableau_stage_errors_total', stage=stage, **labels)
+            raise
+        finally:
+            self.observe('pytableau_stage_seconds', time.perf_counter() - start, stage=stage, **labels)
+            for span in reversed(spans):
+                try:
+                    span.__exit__(type(error) if error else None, error, error.__traceback__ if error else None)
+                except Exception as e:
+                    log.debug("Span hook failed %s" % str(e))
+
+    def _endpoint(self, url) -> str:
+        path = requests.utils.urlparse(url).path
+        path = re.sub(r'^/api/[^/]+', '', path)
+        path = re.sub(r'^/sites/[^/]+', '/sites/{site}', path)
+        return self.ID_PATTERN.sub('{id}', path)
+
+    def _record_response(self, response, *args, **kwargs):
+        try:
+            method = response.request.method
+            endpoint = self._endpoint(response.request.url)
+            self.observe('pytableau_http_request_seconds', response.elapsed.total_seconds(), method=method,
+                         endpoint=endpoint)
+            self.inc('pytableau_http_requests_total', method=method, endpoint=endpoint, status=response.status_code)
+            if response.headers.get('Content-Length') is not None:
+                self.inc('pytableau_http_response_bytes_total', int(response.headers['Content-Length']),
+                         method=method, endpoint=endpoint)
+            else:
+                # chunked responses, e.g. streamed downloads, are counted while their content is read
+                self._count_content(response, method=method, endpoint=endpoint)
+            body = response.request.body
+            self.inc('pytableau_http_request_bytes_total', len(body) if isinstance(body, (bytes, str)) else 0,
+                     method=method, endpoint=endpoint)
+        except Exception as e:
+            log.debug("Failed to record response metrics %s" % str(e))
+        return response
+
+    def _count_content(self, response, **labels):
+        iter_content = response.iter_content
+
+        def _iter_content(*args, **kwargs):
+            content_bytes = 0
+            try:
+                for chunk in iter_content(*args, **kwargs):
+                    content_bytes += len(chunk) if isinstance(chunk, bytes) else len(chunk.encode('utf-8'))
+                    yield chunk
+            finally:
+                self.inc('pytableau_http_response_bytes_total', content_bytes, **labels)
+
+        # response.content reads through iter_content too
+        response.iter_content = _iter_content
+
+    def instrument_session(self, session: requests.Session):
+        """
+        record latency, status and bytes of every call of the session
+
+        :param session: requests session, e.g. server._session
+        """
+        hooks = session.hooks.setdefault('response', list())
+        if self._record_response not in hooks:
+            hooks.append(self._record_response)
+
+    @staticmethod
+    def _format_labels(labels) -> str:
+        if not labels:
+            return ''
+        return '{%s}' % ','.join(
+            '%s="%s"' % (key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+            for key, value in labels)
+
+    def to_prometheus(self) -> str:
+        """
+
+        :return: metrics in prometheus text exposition format
+        """
+        lines = list()
+        with self._lock:
+            for name, counter in sorted(self._counters.items()):
+                lines.append("# TYPE %s counter" % name)
+                for labels, value in sorted(counter.items()):
+                    lines.append("%s%s %s" % (name, self._format_labels(labels), value))
+            for name, histogram in sorted(self._histograms.items()):
+                lines.append("# TYPE %s histogram" % name)
+                for labels, (bucket_counts, total, count) in sorted(histogram.items()):
+                    for bucket, bucket_count in zip(self.buckets, bucket_counts):
+                        lines.append("%s_bucket%s %s" % (name, self._format_labels(labels + (('le', str(bucket)),)),
+                                                         bucket_count))
+                    lines.append("%s_bucket%s %s" % (name, self._format_labels(labels + (('le', '+Inf'),)), count))
+                    lines.append("%s_sum%s %s" % (name, self._format_labels(labels), total))
+                    lines.append("%s_count%s %s" % (name, self._format_labels(labels), count))
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self._counters.clear()
+            self._histograms.clear()
+
+
+# metrics of all PyTableau calls
+metrics = PyTableauMetrics()
 
 
 class PyTableauUtils():
@@ -45,6 +255,37 @@ class PyTableauUtils():
 
     """
 
+    @staticmethod
+    def _require(module, package=None, purpose=None):
+        """
+        import an optional dependency
+
+        :param module: module name, e.g. 'PIL.Image'
+        :param package: pip package providing the module, defaults to module
+        :param purpose: shown in the error message, e.g. 'export png'
+        :return: imported module
+        """
+        try:
+            return importlib.import_module(module)
+        except ImportError:
+            raise Exception('Please `pip install %s`%s' % (package or module, ' to %s' % purpose if purpose else ''))
+
+    @staticmethod
+    def log_to_console(level=logging.INFO, stream=sys.stdout):
+        """
+        print PyTableau logs to the console
+
+        :param level:
+        :param stream:
+        :return: added logging handler
+        """
+        handler = logging.StreamHandler(stream)
+        handler.setLevel(level)
+        handler.setFormatter(logging.Formatter('%(asctime)s - %(levelname)s - %(message)s'))
+        log.setLevel(min(log.level, level) if log.level else level)
+        log.addHandler(handler)
+        return handler
+
     @staticmethod
     def NoneToStr(string):
         """
@@ -54,6 +295,27 @@ class PyTableauUtils():
         """
         return (string or '').replace('\r\n', ' ').replace('\n', ' ').replace('\t', ' ')
 
+    @staticmethod
+    def unique_columns(header: list) -> list:
+        """
+        rename repeated column names, e.g. for parquet. a repeated column at position i is named <column>_<i>, or
+        with the next free suffix when another column already has that name
+
+        :param header:
+        :return: column names
+        """
+        columns = list()
+        taken = set(header)
+        for i, column in enumerate(header):
+            if column in columns:
+                suffix = i
+                while "%s_%s" % (column, suffix) in taken:
+                    suffix += 1
+                column = "%s_%s" % (column, suffix)
+                taken.add(column)
+            columns.append(column)
+        return columns
+
     @staticmethod
     def clean_folder(dirPath):
         """
@@ -68,15 +330,798 @@ class PyTableauUtils():
             else:
                 os.remove(file)
 
+    @staticmethod
+    def file_sha256(file):
+        """
 
-class PyTableau():
+        :param file:
+        :return: hex sha256 digest of file content
+        """
+        sha256 = hashlib.sha256()
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                sha256.update(chunk)
+        return sha256.hexdigest()
+
+    @staticmethod
+    def read_json(file, default=None):
+        """
+
+        :param file:
+        :param default: returned when file doesn't exist
+        :return:
+        """
+        if not os.path.exists(file):
+            return default
+        with open(file, encoding='utf-8') as f:
+            return json.load(f)
+
+    @staticmethod
+    def write_json(file, data):
+        """
+        write data to file atomically
+
+        :param file:
+        :param data:
+        """
+        tmp_file = "%s.tmp" % file
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=1, default=str)
+        os.replace(tmp_file, file)
+
+    @staticmethod
+    def iter_file_chunks(file, chunk_size=1024 * 1024):
+        """
+
+        :param file:
+        :param chunk_size:
+        :return: iterator of file content chunks
+        """
+        with open(file, 'rb') as f:
+            for chunk in iter(lambda: f.read(chunk_size), b''):
+                yield chunk
+
+    @staticmethod
+    def iter_csv_rows(chunks, encoding='utf-8-sig'):
+        """
+        parse csv rows from byte chunks without loading the whole content
+
+        :param chunks: iterable of bytes
+        :param encoding:
+        :return: iterator of csv rows
+        """
+        decoder = codecs.getincrementaldecoder(encoding)()
+
+        def _iter_lines():
+            pending = ''
+            for chunk in chunks:
+                pending += decoder.decode(chunk)
+                *lines, pending = pending.split('\n')
+                for line in lines:
+                    yield line + '\n'
+            pending += decoder.decode(b'', final=True)
+            if pending:
+                yield pending
+
+        return csv.reader(_iter_lines(), delimiter=',')
+
+    @staticmethod
+    def write_xlsx(file, sheets) -> int:
+        """
+        stream csv content of each sheet into a write only excel workbook
+
+        :param file:
+        :param sheets: iterable of (sheet name, csv byte chunks)
+        :return: number of written sheets
+        """
+        openpyxl = PyTableauUtils._require('openpyxl', purpose='export xlsx')
+
+        wb = openpyxl.Workbook(write_only=True)
+        for _ws_name, _chunks in sheets:
+            _ws = wb.create_sheet(_ws_name)
+            for row in PyTableauUtils.iter_csv_rows(_chunks):
+                _ws.append(row)
+        if wb.worksheets:
+            wb.save(file)
+        wb.close()
+        return len(wb.worksheets)
+
+    @staticmethod
+    def write_csv_gz_bundle(file, sheets) -> int:
+        """
+        stream csv content of each sheet into <sheet name>.csv.gz member of a zip bundle
+
+        :param file:
+        :param sheets: iterable of (sheet name, csv byte chunks)
+        :return: number of written sheets
+        """
+        _written_sheets = 0
+        with zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_STORED) as bundle:
+            for _name, _chunks in sheets:
+                with bundle.open("%s.csv.gz" % _name, 'w', force_zip64=True) as member, \
+                        gzip.GzipFile(filename="%s.csv" % _name, mode='wb', fileobj=member) as gz_file:
+                    for chunk in _chunks:
+                        gz_file.write(chunk)
+                _written_sheets += 1
+        return _written_sheets
+
+    @staticmethod
+    def write_parquet_bundle(file, sheets, batch_size=10000) -> int:
+        """
+        stream csv content of each sheet into <sheet name>.parquet member of a zip bundle, csv values are kept as
+        strings
+
+        :param file:
+        :param sheets: iterable of (sheet name, csv byte chunks)
+        :param batch_size: number of rows per parquet row group
+        :return: number of written sheets
+        """
+        pyarrow = PyTableauUtils._require('pyarrow', purpose='export parquet')
+        PyTableauUtils._require('pyarrow.parquet', 'pyarrow', purpose='export parquet')
+
+        _written_sheets = 0
+        with zipfile.ZipFile(file, 'w', compression=zipfile.ZIP_STORED) as bundle:
+            for _name, _chunks in sheets:
+                rows = PyTableauUtils.iter_csv_rows(_chunks)
+                header = next(rows, [])
+                columns = PyTableauUtils.unique_columns(header)
+                schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+                with bundle.open("%s.parquet" % _name, 'w', force_zip64=True) as member, \
+                        pyarrow.parquet.ParquetWriter(member, schema) as writer:
+                    batch = list()
+                    for row in rows:
+                        batch.append((row + [None] * len(columns))[:len(columns)])
+                        if len(batch) >= batch_size:
+                            writer.write_batch(pyarrow.record_batch(list(map(list, zip(*batch))), schema=schema))
+                            batch = list()
+                    if batch:
+                        writer.write_batch(pyarrow.record_batch(list(map(list, zip(*batch))), schema=schema))
+                _written_sheets += 1
+        return _written_sheets
+
+    @staticmethod
+    def write_rows(file, rows, output_format='tsv', batch_size=10000) -> int:
+        """
+        stream dict rows into a tsv, jsonl or parquet file, columns are taken from the first row. tsv output has a
+        leading row index column like pandas to_csv
+
+        :param file:
+        :param rows: iterable of dicts
+        :param output_format: one of tsv, jsonl, parquet
+        :param batch_size: number of rows per parquet row group
+        :return: number of written rows
+        """
+        rows = iter(rows)
+        first_row = next(rows, None)
+        if first_row is None:
+            open(file, 'w').close()
+            return 0
+        columns = list(first_row.keys())
+        row_count = 0
+
+        if output_format == 'tsv':
+            with open(file, 'w', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f, delimiter='\t')
+                writer.writerow([''] + columns)
+                for row in itertools.chain([first_row], rows):
+                    writer.writerow([row_count] + [row.get(column) for column in columns])
+                    row_count += 1
+        elif output_format == 'jsonl':
+            with open(file, 'w', encoding='utf-8') as f:
+                for row in itertools.chain([first_row], rows):
+                    f.write(json.dumps(row, ensure_ascii=False) + '\n')
+                    row_count += 1
+        elif output_format == 'parquet':
+            pyarrow = PyTableauUtils._require('pyarrow', purpose='export parquet')
+            PyTableauUtils._require('pyarrow.parquet', 'pyarrow', purpose='export parquet')
+            schema = pyarrow.schema([(column, pyarrow.string()) for column in columns])
+            with pyarrow.parquet.ParquetWriter(file, schema) as writer:
+                batch = list()
+                for row in itertools.chain([first_row], rows):
+                    batch.append(row)
+                    row_count += 1
+                    if len(batch) >= batch_size:
+                        writer.write_batch(pyarrow.RecordBatch.from_pylist(batch, schema=schema))
+                        batch = list()
+                if batch:
+                    writer.write_batch(pyarrow.RecordBatch.from_pylist(batch, schema=schema))
+        else:
+            raise Exception("Unexpected output_format '%s'!" % output_format)
+        return row_count
+
+    @staticmethod
+    def retry(func, *args, attempt=1, wait=5, **kwargs):
+        """
+        call func with given arguments, retry it up to attempt times when it fails
+
+        :param func:
+        :param attempt: maximum number of calls
+        :param wait: seconds to wait between calls
+        :return: result of func
+        """
+        current_attempt = 1
+        while True:
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if current_attempt >= attempt:
+                    raise e
+                current_attempt = current_attempt + 1
+                log.debug(str(e))
+                log.info("Calling '%s' failed Trying %s th time" % (getattr(func, '__name__', func), current_attempt))
+                time.sleep(wait)
+
+
+class PyTableauPdfWriter():
+    """
+    incremental pdf writer. pages of each appended pdf document are written to the output file right away and only
+    object offsets are kept, so peak memory grows with the largest appended document
+    """
+
+    def __init__(self, file):
+        self._pypdf = PyTableauUtils._require('PyPDF3', purpose='export pdf')
+        self._generic = PyTableauUtils._require('PyPDF3.generic', 'PyPDF3', purpose='export pdf')
+        # object number -> offset in the output file, object numbers start from 1
+        self._offsets = [None]
+        self._page_refs = list()
+        self._pages_ref = self._reserve()
+        self._root_ref = self._reserve()
+        self._stream = open(file, 'wb')
+        self._stream.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def num_pages(self):
+        return len(self._page_refs)
+
+    def _reserve(self):
+        self._offsets.append(None)
+        return self._generic.IndirectObject(len(self._offsets) - 1, 0, None)
+
+    def _write_object(self, ref, obj):
+        self._offsets[ref.idnum] = self._stream.tell()
+        self._stream.write(b'%d 0 obj\n' % ref.idnum)
+        obj.writeToStream(self._stream, None)
+        self._stream.write(b'\nendobj\n')
+
+    def append(self, pdf_content: bytes):
+        """
+        copy pages of the pdf document and the objects they reference to the output file
+
+        :param pdf_content: pdf document bytes
+        """
+        ArrayObject, DictionaryObject, IndirectObject, NameObject = (
+            self._generic.ArrayObject, self._generic.DictionaryObject, self._generic.IndirectObject,
+            self._generic.NameObject)
+
+        reader = self._pypdf.PdfFileReader(io.BytesIO(pdf_content), strict=False)
+        # reader object number -> output object reference
+        ref_map = dict()
+        converted = set()
+        pending = list()
+
+        def _ref(indirect):
+            key = (indirect.idnum, indirect.generation)
+            if key not in ref_map:
+                ref_map[key] = self._reserve()
+                pending.append(indirect)
+            return ref_map[key]
+
+        def _convert(obj):
+            # replace references to reader objects with references to output objects, inherited page attributes
+            # are shared between pages so each direct object is converted once
+            if isinstance(obj, IndirectObject):
+                return _ref(obj)
+            if id(obj) in converted:
+                return obj
+            converted.add(id(obj))
+            if isinstance(obj, DictionaryObject):
+                for key, value in list(obj.items()):
+                    obj[key] = _convert(value)
+            elif isinstance(obj, ArrayObject):
+                for i, value in enumerate(obj):
+                    obj[i] = _convert(value)
+            return obj
+
+        pages = list(reader.pages)
+        page_refs = list()
+        for page in pages:
+            page_ref = self._reserve()
+            if page.indirectRef is not None:
+                ref_map[(page.indirectRef.idnum, page.indirectRef.generation)] = page_ref
+            page_refs.append(page_ref)
+
+        for page, page_ref in zip(pages, page_refs):
+            # drop the reference to the source page tree before converting, otherwise it is copied as orphan object
+            page.pop('/Parent', None)
+            page = _convert(page)
+            page[NameObject('/Parent')] = self._pages_ref
+            self._write_object(page_ref, page)
+            while pending:
+                indirect = pending.pop()
+                self._write_object(ref_map[(indirect.idnum, indirect.generation)],
+                                   _convert(indirect.getObject()))
+        self._page_refs.extend(page_refs)
+
+    def close(self):
+        """
+        write page tree, catalog and cross reference table and close the output file
+        """
+        if self._stream.closed:
+            return
+        ArrayObject, DictionaryObject, NameObject, NumberObject = (
+            self._generic.ArrayObject, self._generic.DictionaryObject, self._generic.NameObject,
+            self._generic.NumberObject)
+
+        self._write_object(self._pages_ref, DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject(self._page_refs),
+            NameObject('/Count'): NumberObject(len(self._page_refs))}))
+        self._write_object(self._root_ref, DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): self._pages_ref}))
+
+        xref_offset = self._stream.tell()
+        self._stream.write(b'xref\n0 %d\n0000000000 65535 f \n' % len(self._offsets))
+        for offset in self._offsets[1:]:
+            if offset is None:
+                self._stream.write(b'0000000000 65535 f \n')
+            else:
+                self._stream.write(b'%010d 00000 n \n' % offset)
+        self._stream.write(b'trailer\n')
+        DictionaryObject({NameObject('/Size'): NumberObject(len(self._offsets)),
+                          NameObject('/Root'): self._root_ref}).writeToStream(self._stream, None)
+        self._stream.write(b'\nstartxref\n%d\n%%%%EOF\n' % xref_offset)
+        self._stream.close()
+
+
+class PyTableauMetadataCache():
+    """
+    sqlite cache of field rows extracted from workbook and datasource files. cached rows of a file are used while its
+    mtime and size, or its content hash, are unchanged
+    """
+
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self._conn = sqlite3.connect(cache_file)
+        self._conn.execute("CREATE TABLE IF NOT EXISTS field_rows "
+                           "(path TEXT PRIMARY KEY, mtime REAL, size INTEGER, sha256 TEXT, rows TEXT)")
+
+    def get(self, file):
+        """
+
+        :param file:
+        :return: cached field rows of the file, None when the file is changed or not cached
+        """
+        path = os.path.abspath(file)
+        cached = self._conn.execute("SELECT mtime, size, sha256, rows FROM field_rows WHERE path = ?",
+                                    (path,)).fetchone()
+        if cached is None:
+            return None
+        mtime, size, sha256, rows = cached
+        stat = os.stat(path)
+        if (stat.st_mtime, stat.st_size) != (mtime, size):
+            if PyTableauUtils.file_sha256(path) != sha256:
+                return None
+            # file is touched but not changed
+            with self._conn:
+                self._conn.execute("UPDATE field_rows SET mtime = ?, size = ? WHERE path = ?",
+                                   (stat.st_mtime, stat.st_size, path))
+        return json.loads(rows)
+
+    def put(self, file, rows: list):
+        """
+
+        :param file:
+        :param rows: field rows of the file
+        """
+        path = os.path.abspath(file)
+        stat = os.stat(path)
+        with self._conn:
+            self._conn.execute("INSERT OR REPLACE INTO field_rows (path, mtime, size, sha256, rows) "
+                               "VALUES (?, ?, ?, ?, ?)",
+                               (path, stat.st_mtime, stat.st_size, PyTableauUtils.file_sha256(path),
+                                json.dumps(rows)))
+
+    def prune(self, files_dir, files: list):
+        """
+        remove cached files of files_dir which are not in files
+
+        :param files_dir:
+        :param files: existing files of files_dir
+        """
+        prefix = os.path.join(os.path.abspath(files_dir), '')
+        existing_paths = {os.path.abspath(file) for file in files}
+        removed_paths = [(path,) for path, in self._conn.execute("SELECT path FROM field_rows")
+                         if path.startswith(prefix) and path not in existing_paths]
+        with self._conn:
+            self._conn.executemany("DELETE FROM field_rows WHERE path = ?", removed_paths)
+
+    def close(self):
+        self._conn.close()
+
+
+class PyTableauRateLimiter():
+    """
+    limit calls shared by multiple threads to given number of calls per second
+    """
+
+    def __init__(self, rate=None):
+        self.interval = 1.0 / rate if rate else 0
+        self._next_call = 0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        """
+        block until the next call is allowed
+        """
+        if not self.interval:
+            return
+        with self._lock:
+            now = time.monotonic()
+            wait = self._next_call - now
+            self._next_call = max(now, self._next_call) + self.interval
+        if wait > 0:
+            time.sleep(wait)
+
+
+class PyTableauJobTracker():
+    """
+    track server jobs until they finish. job statuses are checked concurrently, the polling interval starts at
+    min_interval and backs off up to max_interval with random jitter
+    """
+
+    def __init__(self, server: TSC.Server, min_interval=5, max_interval=300, backoff=2, jitter=0.2, max_workers=8):
+        self.server = server
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.max_workers = max_workers
+
+    @staticmethod
+    def is_succeeded(job) -> bool:
+        return str(job.finish_code) == '0'
+
+    def poll(self, jobs: dict, executor: ThreadPoolExecutor) -> dict:
+        """
+        check statuses of given jobs once
+
+        :param jobs: dict of key to JobItem
+        :param executor: executor checking job statuses concurrently
+        :return: dict of key to finished JobItem
+        """
+        completed_jobs = dict()
+        keys = list(jobs.keys())
+        for key, job in zip(keys, executor.map(self.server.jobs.get_by_id, [jobs[key].id for key in keys])):
+            if job.completed_at is not None:
+                completed_jobs[key] = job
+            else:
+                log.debug("%s Job Running %s " % (key, str(job)))
+        return completed_jobs
+
+    def next_interval(self, interval):
+        """
+
+        :param interval: current polling interval
+        :return: (seconds to sleep with jitter, next polling interval)
+        """
+        return interval * random.uniform(1 - self.jitter, 1 + self.jitter), min(interval * self.backoff,
+                                                                               self.max_interval)
+
+    def as_completed(self, jobs: dict, timeout=None):
+        """
+        yield (key, job) pairs of given jobs as soon as they finish
+
+        :param jobs: dict of key to JobItem
+        :param timeout: seconds to wait for all jobs to finish
+        """
+        pending_jobs = dict(jobs)
+        interval = self.min_interval
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while pending_jobs:
+                wait, interval = self.next_interval(interval)
+                if deadline is not None:
+                    if deadline - time.monotonic() <= 0:
+                        raise TimeoutError("Following Jobs are not finished in %s seconds \n[%s]!" % (
+                            timeout, ','.join(pending_jobs.keys())))
+                    wait = min(wait, deadline - time.monotonic())
+                time.sleep(max(wait, 0))
+
+                for key, job in self.poll(pending_jobs, executor=executor).items():
+                    pending_jobs.pop(key)
+                    yield key, job
+
+    def wait(self, jobs: dict, timeout=None, on_complete=None) -> dict:
+        """
+        wait until all given jobs finish
+
+        :param jobs: dict of key to JobItem
+        :param timeout: seconds to wait for all jobs to finish
+        :param on_complete: callback called with (key, job) as soon as a job finishes
+        :return: dict of key to finished JobItem
+        """
+        completed_jobs = dict()
+        for key, job in self.as_completed(jobs, timeout=timeout):
+            completed_jobs[key] = job
+            if on_complete is not None:
+                on_complete(key, job)
+        return completed_jobs
+
+
+class PyTableauCatalog():
+    """
+    in memory catalog of workbooks, datasources and projects of the signed in site. each content type is loaded in bulk
+    on first lookup. after ttl seconds workbooks and datasources are updated incrementally using updated_at, and fully
+    reloaded when items were removed on the server, projects are reloaded. lookup results are kept in a lru cache of
+    max_size entries
+    """
+    CONTENT_TYPES = ('workbook', 'datasource', 'project')
+
+    def __init__(self, server, ttl=300, max_size=1024, page_size=1000):
+        self.server = server
+        self.ttl = ttl
+        self.max_size = max_size
+        self.page_size = page_size
+        # content_type -> item id -> item
+        self._items = dict()
+        self._loaded_at = dict()
+        self._lookups = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _endpoint(self, content_type):
+        if content_type == 'workbook':
+            return self.server.workbooks
+        elif content_type == 'datasource':
+            return self.server.datasources
+        elif content_type == 'project':
+            return self.server.projects
+        raise Exception("Unexpected content_type '%s'!" % content_type)
+
+    def invalidate(self, content_type=None):
+        """
+        drop cached items, they are loaded again on next lookup
+
+        :param content_type: workbook, datasource or project, all content types when None
+        """
+        with self._lock:
+            for ct in ([content_type] if content_type else self.CONTENT_TYPES):
+                self._items.pop(ct, None)
+                self._loaded_at.pop(ct, None)
+            self._lookups.clear()
+
+    def _load(self, content_type) -> dict:
+        endpoint = self._endpoint(content_type)
+        items = self._items.get(content_type)
+        updated = [item.updated_at for item in (items or dict()).values() if getattr(item, 'updated_at', None)]
+        if updated:
+            req_option = TSC.RequestOptions(pagesize=self.page_size)
+            req_option.filter.add(TSC.Filter(TSC.RequestOptions.Field.UpdatedAt,
+                                             TSC.RequestOptions.Operator.GreaterThanOrEqual,
+                                             max(updated).strftime('%Y-%m-%dT%H:%M:%SZ')))
+            changed_items = list(TSC.Pager(endpoint, request_opts=req_option))
+            for item in changed_items:
+                items[item.id] = item
+            # removed items can not be found by updated_at, compare the item count
+            _, pagination_item = endpoint.get(req_options=TSC.RequestOptions(pagesize=1))
+            if int(pagination_item.total_available) == len(items):
+                log.info("Updated %s %ss in catalog" % (len(changed_items), content_type))
+                return items
+
+        req_option = TSC.RequestOptions(pagesize=self.page_size)
+        items = {item.id: item for item in TSC.Pager(endpoint, request_opts=req_option)}
+        log.info("Loaded %s %ss into catalog" % (len(items), content_type))
+        return items
+
+    def items(self, content_type) -> list:
+        """
+
+        :param content_type: workbook, datasource or project
+        :return: all items of the content type, loaded or updated when expired
+        """
+        with self._lock:
+            loaded_at = self._loaded_at.get(content_type)
+            if loaded_at is None or (self.ttl is not None and time.monotonic() - loaded_at > self.ttl):
+                self._items[content_type] = self._load(content_type)
+                self._loaded_at[content_type] = time.monotonic()
+                for key in [key for key in self._lookups.keys() if key[0] == content_type]:
+                    self._lookups.pop(key)
+            return list(self._items[content_type].values())
+
+    def find(self, content_type, name=None, project_name=None, tag=None, parent_id=None) -> list:
+        """
+        find items matching all given values, like the name, projectName and tags server side filters. names are
+        matched case insensitive like PyTableau.get_items_by_names
+
+        :param content_type: workbook, datasource or project
+        :param name:
+        :param project_name: name of the project of workbooks and datasources
+        :param tag:
+        :param parent_id: parent project id of projects
+        :return: list of items
+        """
+        name = name.lower() if name else None
+        key = (content_type, name, project_name or None, tag or None, parent_id or None)
+        with self._lock:
+            items = self.items(content_type)
+            if key in self._lookups:
+                self._lookups.move_to_end(key)
+                return list(self._lookups[key])
+
+            found = [item for item in items
+                     if (not name or item.name.lower() == name)
+                     and (not project_name or getattr(item, 'project_name', None) == project_name)
+                     and (not tag or tag in (getattr(item, 'tags', None) or set()))
+                     and (not parent_id or getattr(item, 'parent_id', None) == parent_id)]
+            self._lookups[key] = found
+            if self.max_size is not None and len(self._lookups) > self.max_size:
+                self._lookups.popitem(last=False)
+            return list(found)
+
+
+class PyTableauTokenCache():
+    """
+    auth tokens shared by processes, persisted in a json file readable by its owner only. tokens older than max_age
+    seconds are not reused
+    """
+
+    def __init__(self, cache_file, max_age=3 * 60 * 60):
+        self.cache_file = os.path.expanduser(cache_file)
+        self.max_age = max_age
+        self._lock = threading.Lock()
+
+    def get(self, key) -> dict:
+        """
+
+        :param key:
+        :return: cached token dict with site_id, user_id, site_url, auth_token and created_at keys, None when missing
+            or expired
+        """
+        token = PyTableauUtils.read_json(self.cache_file, default=dict()).get(key)
+        if token is None or (self.max_age is not None and time.time() - token['created_at'] > self.max_age):
+            return None
+        return token
+
+    def _update(self, key, token=None):
+        with self._lock:
+            tokens = PyTableauUtils.read_json(self.cache_file, default=dict())
+            if token is None:
+                tokens.pop(key, None)
+            else:
+                tokens[key] = token
+            cache_dir = os.path.dirname(self.cache_file)
+            if cache_dir:
+                os.makedirs(cache_dir, mode=0o700, exist_ok=True)
+            tmp_file = "%s.%s.tmp" % (self.cache_file, os.getpid())
+            with os.fdopen(os.open(tmp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as f:
+                json.dump(tokens, f)
+            os.replace(tmp_file, self.cache_file)
+
+    def put(self, key, site_id, user_id, auth_token, site_url=None):
+        self._update(key, {'site_id': site_id, 'user_id': user_id, 'site_url': site_url, 'auth_token': auth_token,
+                           'created_at': time.time()})
+
+    def delete(self, key):
+        self._update(key)
+
+
+class PyTableauThreadSessions():
+    """
+    stands in for the requests session of the server and hands out one session per thread. hooks, headers and mounted
+    adapters are shared by all sessions
     """
 
+    def __init__(self, session: requests.Session):
+        self._base = session
+        self._local = threading.local()
+
+    def _session(self) -> requests.Session:
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.close()
+            session.hooks = self._base.hooks
+            session.headers = self._base.headers
+            session.adapters = self._base.adapters
+            session.verify = self._base.verify
+            session.proxies = self._base.proxies
+            session.cert = self._base.cert
+            session.trust_env = self._base.trust_env
+            session.request = functools.partial(self._request, session.request)
+            self._local.session = session
+        return session
+
+    def _request(self, request, method, url, **kwargs):
+        if kwargs.get('timeout') is None:
+            kwargs['timeout'] = getattr(self._local, 'timeout', None)
+        return request(method, url, **kwargs)
+
+    @contextmanager
+    def request_timeout(self, timeout):
+        """
+        requests of the current thread not given a timeout wait at most timeout seconds for the server to connect and
+        to send data
+
+        :param timeout:
+        """
+        previous_timeout = getattr(self._local, 'timeout', None)
+        self._local.timeout = timeout
+        try:
+            yield
+        finally:
+            self._local.timeout = previous_timeout
+
+    def __getattr__(self, name):
+        return getattr(self._session(), name)
+
+
+class PyTableau():
     """
 
-    def __init__(self, server_address, username, password, site_id, use_server_version=True, verify_ssl=True):
+    """
+    MANIFEST_FILE = '.pytableau_manifest.json'
+    # PyTableauCatalog used by lookups, see use_catalog
+    catalog = None
+    FIELD_FILE_EXTENSIONS = {'tsv': '.csv', 'jsonl': '.jsonl', 'parquet': '.parquet'}
+    WORKBOOK_FIELDS_QUERY = """
+query workbookFields($first: Int, $afterToken: String) {
+  workbooksConnection(first: $first, after: $afterToken, orderBy: {field: NAME, direction: ASC}) {
+    nodes {
+      name
+      embeddedDatasources {
+        name
+        fields {
+          __typename
+          name
+          fullyQualifiedName
+          description
+          downstreamSheets { name }
+          ... on ColumnField { dataType role aggregation }
+          ... on CalculatedField { dataType role formula }
+          ... on DatasourceField {
+            remoteField {
+              __typename
+              ... on ColumnField { dataType role aggregation }
+              ... on CalculatedField { dataType role formula }
+            }
+          }
+        }
+      }
+    }
+    pageInfo { hasNextPage endCursor }
+  }
+}
+"""
+
+    def __init__(self, server_address, username, password, site_id, use_server_version=True, verify_ssl=True,
+                 token_name=None, personal_access_token=None, token_cache_file=None, token_max_age=3 * 60 * 60):
+        """
 
-        self.tableau_auth = TSC.TableauAuth(username=username, password=password, site_id=site_id)
+        :param server_address:
+        :param username: not used with personal_access_token
+        :param password:
+        :param site_id:
+        :param use_server_version:
+        :param verify_ssl:
+        :param token_name: personal access token name
+        :param personal_access_token: sign in with the personal access token instead of username and password
+        :param token_cache_file: json file sharing the auth token between processes, e.g. ~/.pytableau/tokens.json.
+            the cached token is reused instead of signing in and it is not signed out when the object is deleted
+        :param token_max_age: seconds a cached token is reused
+        """
+        if personal_access_token:
+            self.tableau_auth = TSC.PersonalAccessTokenAuth(token_name, personal_access_token, site_id=site_id)
+        else:
+            self.tableau_auth = TSC.TableauAuth(username=username, password=password, site_id=site_id)
+        self.token_cache = PyTableauTokenCache(token_cache_file, max_age=token_max_age) if token_cache_file else None
+        self._token_key = "%s|%s|%s" % (server_address, site_id, token_name if personal_access_token else username)
+        self._auth_lock = threading.RLock()
         self.server = TSC.Server(server_address=server_address, use_server_version=use_server_version)
 
         self.server.add_http_options({'verify': verify_ssl})
@@ -85,130 +1130,515 @@ class PyTableau():
         self.sign_in()
 
     def __del__(self):
+        # cached tokens are kept for other processes
+        if getattr(self, 'token_cache', None) is not None:
+            return
         try:
             self.server.auth.sign_out()
         except:
             pass
 
+    def _install_session(self):
+        # signing out creates a new session
+        if not isinstance(self.server._session, PyTableauThreadSessions):
+            self.server._session = PyTableauThreadSessions(self.server._session)
+        metrics.instrument_session(self.server._session)
+        hooks = self.server._session.hooks.setdefault('response', list())
+        if self._sign_in_again not in hooks:
+            hooks.append(self._sign_in_again)
+
+    def _sign_in(self):
+        with self._auth_lock:
+            # keep the credentials, sign_in returns a context manager
+            self.server.auth.sign_in(self.tableau_auth)
+            if self.token_cache is not None:
+                self.token_cache.put(self._token_key, site_id=self.server.site_id, user_id=self.server.user_id,
+                                     auth_token=self.server.auth_token,
+                                     site_url=getattr(self.server, '_site_url', None))
+
+    def _sign_in_again(self, response, *args, **kwargs):
+        """
+        response hook signing in again when the auth token expired and retrying the request once
+        """
+        request = response.request
+        if response.status_code != 401 or request.url.endswith('/auth/signin') \
+                or request.headers.get('X-Tableau-Auth') is None or getattr(request, 'pytableau_retry', False):
+            return response
+        with self._auth_lock:
+            # concurrent requests sign in only once
+            if request.headers.get('X-Tableau-Auth') == self.server.auth_token:
+                log.info("Auth token expired, signing in again to %s" % self.server.server_address)
+                if self.token_cache is not None:
+                    self.token_cache.delete(self._token_key)
+                self._sign_in()
+        retry_request = request.copy()
+        retry_request.headers['X-Tableau-Auth'] = self.server.auth_token
+        retry_request.pytableau_retry = True
+        # release the connection of the failed response
+        response.close()
+        return self.server._session.send(retry_request, **kwargs)
+
     def sign_in(self):
-        self.tableau_auth = self.server.auth.sign_in(self.tableau_auth)
+        self._install_session()
+        token = self.token_cache.get(self._token_key) if self.token_cache is not None else None
+        if token is not None:
+            log.info("Reusing cached auth token for %s" % self.server.server_address)
+            self.server._set_auth(token['site_id'], token['user_id'], token['auth_token'], token.get('site_url'))
+        else:
+            self._sign_in()
+        if self.catalog is not None:
+            self.catalog.invalidate()
 
     def sign_out(self):
+        if self.token_cache is not None:
+            self.token_cache.delete(self._token_key)
         self.server.auth.sign_out()
 
-    def download_all_datasources(self, download_dir, include_extract=False):
+    def use_catalog(self, ttl=300, max_size=1024):
+        """
+        serve get_*_by_name, get_workbooks_by_tag and get_items_by_names lookups from a PyTableauCatalog loaded in bulk
+        instead of one filtered request per lookup
+
+        :param ttl: seconds after which cached items are updated from the server, None to never update
+        :param max_size: number of lookup results kept
+        :return: PyTableauCatalog, call its invalidate method after changing items on the server
+        """
+        self.catalog = PyTableauCatalog(self.server, ttl=ttl, max_size=max_size)
+        return self.catalog
+
+    def set_http_pool_size(self, pool_size):
+        """
+        size the connection pool of the http session shared by all server calls, calls running concurrently beyond
+        pool_size open connections that are not reused
+
+        :param pool_size:
+        """
+        adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.server._session.mount('https://', adapter)
+        self.server._session.mount('http://', adapter)
+
+    def _download_all(self, endpoint, item_type, download_dir, max_workers=1, retry_attempt=1, incremental=False,
+                      **download_options) -> dict:
+        """
+        download all items of given endpoint into project folders of download_dir. server items are listed page by
+        page while a pool of workers downloads them.
+
+        with incremental=True download_dir is synced using a manifest of item id, updated_at, file mtime, size and
+        content hash, files are hashed only when their mtime or size changed. only new or changed items are
+        downloaded and only the items removed from the server are deleted
+
+        :param endpoint: self.server.workbooks or self.server.datasources
+        :param item_type: item type used in log messages
+        :param download_dir:
+        :param max_workers: number of items downloaded concurrently
+        :param retry_attempt: number of download attempts per item
+        :param incremental: sync download_dir instead of downloading every item
+        :param download_options: options passed to endpoint.download
+        :return: summary dict, 'downloaded' list of downloaded files, 'failed' dict of item name to error,
+            'unchanged' list of up to date files and 'deleted' list of removed files
+        """
+        summary = {'downloaded': list(), 'failed': dict(), 'unchanged': list(), 'deleted': list()}
+        summary_lock = threading.Lock()
+        # limit number of listed but not yet downloaded items
+        pending_slots = threading.BoundedSemaphore(max(max_workers, 1) * 2)
+        manifest_file = os.path.join(download_dir, self.MANIFEST_FILE)
+        manifest = PyTableauUtils.read_json(manifest_file, default=dict()) if incremental else dict()
+        server_item_ids = set()
+
+        def _is_unchanged(item):
+            entry = manifest.get(item.id)
+            if entry is None or entry['updated_at'] != str(item.updated_at) or not os.path.isfile(entry['path']):
+                return False
+            # content is hashed only when mtime or size of the local file changed, like PyTableauMetadataCache
+            stat = os.stat(entry['path'])
+            if (stat.st_mtime, stat.st_size) == (entry.get('mtime'), entry.get('size')):
+                return True
+            if PyTableauUtils.file_sha256(entry['path']) != entry['sha256']:
+                return False
+            entry.update(mtime=stat.st_mtime, size=stat.st_size)
+            return True
+
+        def _download(item):
+            try:
+                item_download_dir = os.path.join(download_dir, item.project_name)
+                os.makedirs(item_download_dir, exist_ok=True)
+                path = PyTableauUtils.retry(endpoint.download, item.id, filepath=item_download_dir,
+                                            attempt=retry_attempt, **download_options)
+                log.info("Downloaded %s: %s " % (item_type, path))
+                with summary_lock:
+                    summary['downloaded'].append(path)
+                if incremental:
+                    previous_entry = manifest.get(item.id)
+                    if previous_entry and previous_entry['path'] != path and os.path.isfile(previous_entry['path']):
+                        os.remove(previous_entry['path'])
+                    stat = os.stat(path)
+                    manifest[item.id] = {'name': item.name, 'updated_at': str(item.updated_at), 'path': path,
+                                         'sha256': PyTableauUtils.file_sha256(path), 'mtime': stat.st_mtime,
+                                         'size': stat.st_size}
+            except Exception as e:
+                # pass this error "UnicodeEncodeError 'ascii' codec can't encode characters in position : ordinal
+                # not in range(128)"
+                log.info("Skipping %s %s " % (item_type, item.name))
+                with summary_lock:
+                    summary['failed']["%s/%s" % (item.project_name, item.name)] = str(e).strip()
+            finally:
+                pending_slots.release()
+
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            for server_item in TSC.Pager(endpoint):
+                server_item_ids.add(server_item.id)
+                if incremental and _is_unchanged(server_item):
+                    summary['unchanged'].append(manifest[server_item.id]['path'])
+                    continue
+                pending_slots.acquire()
+                executor.submit(_download, server_item)
+
+        if incremental:
+            for item_id in set(manifest.keys()) - server_item_ids:
+                removed_entry = manifest.pop(item_id)
+                if os.path.isfile(removed_entry['path']):
+                    os.remove(removed_entry['path'])
+                summary['deleted'].append(removed_entry['path'])
+                log.info("Deleted %s: %s " % (item_type, removed_entry['path']))
+            PyTableauUtils.write_json(manifest_file, manifest)
+
+        log.info("Downloaded %s %ss, %s unchanged, %s deleted, %s failed" % (
+            len(summary['downloaded']), item_type, len(summary['unchanged']), len(summary['deleted']),
+            len(summary['failed'])))
+        if summary['failed']:
+            log.warning("Failed to download %ss: %s" % (item_type, ', '.join(summary['failed'].keys())))
+        return summary
+
+    def download_all_datasources(self, download_dir, include_extract=False, max_workers=1, retry_attempt=1,
+                                 incremental=False) -> dict:
         """
 
         :param download_dir:
         :param include_extract:
+        :param max_workers: number of datasources downloaded concurrently
+        :param retry_attempt: number of download attempts per datasource
+        :param incremental: download only new or changed datasources and delete the removed ones
+        :return: download summary, see _download_all
         """
-        PyTableauUtils.clean_folder(download_dir)
-        for server_datasource in TSC.Pager(self.server.datasources):
-            ds_download_dir = os.path.join(download_dir, server_datasource.project_name)
-            if not os.path.exists(ds_download_dir):
-                os.makedirs(ds_download_dir)
-            path = self.server.datasources.download(server_datasource.id, filepath=ds_download_dir,
-                                                    include_extract=include_extract)
-            log.info("Downloaded datasource: %s " % path)
+        if not incremental:
+            PyTableauUtils.clean_folder(download_dir)
+        summary = self._download_all(self.server.datasources, item_type='datasource', download_dir=download_dir,
+                                     max_workers=max_workers, retry_attempt=retry_attempt, incremental=incremental,
+                                     include_extract=include_extract)
         log.info("Download Completed! Download directory %s" % download_dir)
+        return summary
 
-    def download_all_workbooks(self, download_dir):
+    def download_all_workbooks(self, download_dir, max_workers=1, retry_attempt=1, incremental=False) -> dict:
         """
         download all workbooks from server to given directory
 
         :param download_dir:
+        :param max_workers: number of workbooks downloaded concurrently
+        :param retry_attempt: number of download attempts per workbook
+        :param incremental: download only new or changed workbooks and delete the removed ones
+        :return: download summary, see _download_all
         """
 
-        PyTableauUtils.clean_folder(download_dir)
-        for server_workbook in TSC.Pager(self.server.workbooks):
-            wb_download_dir = os.path.join(download_dir, server_workbook.project_name)
-            if not os.path.exists(wb_download_dir):
-                os.makedirs(wb_download_dir)
-            try:
-                path = self.server.workbooks.download(server_workbook.id, filepath=wb_download_dir,
-                                                      include_extract=False)
-                log.info("Downloaded workbook: %s " % path)
-            except Exception:
-                # pass this error "UnicodeEncodeError 'ascii' codec can't encode characters in position : ordinal
-                # not in range(128)"
-                log.info("Skipping workbook %s " % server_workbook.name)
+        if not incremental:
+            PyTableauUtils.clean_folder(download_dir)
+        summary = self._download_all(self.server.workbooks, item_type='workbook', download_dir=download_dir,
+                                     max_workers=max_workers, retry_attempt=retry_attempt, incremental=incremental,
+                                     include_extract=False)
         log.info("Download Completed! Download directory %s " % download_dir)
+        return summary
 
-    def get_all_workbook_fields(self, workbooks_dir):
+    @staticmethod
+    def _list_files(files_dir, file_type) -> list:
+        """
+
+        :param files_dir:
+        :param file_type: part of the file name, twb or tds
+        :return: list of files found in given directory
+        """
+        return [os.path.join(root, filename) for root, _, filenames in os.walk(files_dir)
+                for filename in filenames if file_type in filename]
+
+    @staticmethod
+    def _workbook_field_rows(workbook_file, skip_errors=True) -> list:
+        """
+
+        :param workbook_file:
+        :param skip_errors: return no rows for workbooks that can not be read instead of raising
+        :return: field rows of the workbook, one row per field and worksheet
+        """
+        tableaudocumentapi = PyTableauUtils._require('tableaudocumentapi', purpose='extract workbook fields')
+
+        rows_list = []
+        # read metadata of workbook
+        try:
+            log.info("Processing %s " % os.path.basename(workbook_file))
+            my_wb = tableaudocumentapi.workbook.Workbook(workbook_file)
+        except Exception:
+            if not skip_errors:
+                raise
+            return rows_list
+        for myDS in my_wb.datasources:
+            for _, field in myDS.fields.items():
+                if len(field.worksheets) > 0:
+                    for myWorksheet in field.worksheets:
+                        field_dict = PyTableau._field_dict(field, datasource=myDS, workbook=my_wb,
+                                                           worksheet=myWorksheet)
+                        rows_list.append(field_dict)
+                else:
+                    field_dict = PyTableau._field_dict(field, datasource=myDS, workbook=my_wb)
+                    rows_list.append(field_dict)
+        return rows_list
+
+    @staticmethod
+    def _datasource_field_rows(datasource_file, skip_errors=False) -> list:
+        """
+
+        :param datasource_file:
+        :param skip_errors: return no rows for datasources that can not be read instead of raising
+        :return: field rows of the datasource
+        """
+        tableaudocumentapi = PyTableauUtils._require('tableaudocumentapi', purpose='extract datasource fields')
+
+        log.info("Processing " + os.path.basename(datasource_file))
+        # read metadata of workbook
+        try:
+            my_ds = tableaudocumentapi.datasource.Datasource.from_file(datasource_file)
+        except Exception:
+            if not skip_errors:
+                raise
+            return list()
+        return [PyTableau._field_dict(field, datasource=my_ds) for _, field in my_ds.fields.items()]
+
+    @staticmethod
+    def _field_columns(field_rows, files) -> tuple:
+        """
+        extract field rows of given files as a columnar batch
+
+        :param field_rows: _workbook_field_rows or _datasource_field_rows
+        :param files:
+        :return: dict of column name to column values and list of (file, number of rows) pairs, number of rows is None
+            for files that can not be read
+        """
+        columns = dict()
+        file_row_counts = list()
+        for file in files:
+            try:
+                rows = field_rows(file, skip_errors=False)
+            except Exception as e:
+                log.warning("Skipping %s %s" % (os.path.basename(file), str(e).strip()))
+                file_row_counts.append((file, None))
+                continue
+            for row in rows:
+                for column, value in row.items():
+                    columns.setdefault(column, []).append(value)
+            file_row_counts.append((file, len(rows)))
+        return columns, file_row_counts
+
+    def _get_all_fields(self, field_rows, files_dir, file_type, processes=1, cache_file=None):
+        """
+        extract field rows of the files found in given directory. when processes > 1 files are split into shards
+        parsed by a process pool, columnar batches of the shards are concatenated in file order. with cache_file only
+        the files changed since the last run are parsed
+
+        :param field_rows: _workbook_field_rows or _datasource_field_rows
+        :param files_dir:
+        :param file_type: part of the file name, twb or tds
+        :param processes: number of parser processes, None uses all cpus
+        :param cache_file: sqlite file caching field rows of parsed files
+        :return: pandas DataFrame
+        """
+        pd = PyTableauUtils._require('pandas', purpose='get fields as DataFrame')
+        files = self._list_files(files_dir, file_type)
+        cache = PyTableauMetadataCache(cache_file) if cache_file else None
+        file_rows = dict()
+        if cache is not None:
+            for file in files:
+                rows = cache.get(file)
+                if rows is not None:
+                    file_rows[file] = rows
+            log.info("Found %s of %s files in metadata cache %s" % (len(file_rows), len(files), cache_file))
+
+        changed_files = [file for file in files if file not in file_rows]
+        processes = processes or os.cpu_count()
+        if processes <= 1 or len(changed_files) <= 1:
+            batches = [self._field_columns(field_rows, changed_files)]
+        else:
+            shard_size = math.ceil(len(changed_files) / (processes * 4))
+            shards = [changed_files[i:i + shard_size] for i in range(0, len(changed_files), shard_size)]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                batches = list(executor.map(functools.partial(PyTableau._field_columns, field_rows), shards))
+
+        if cache is None:
+            frames = [pd.DataFrame(columns) for columns, _ in batches if columns]
+            return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+
+        for columns, file_row_counts in batches:
+            row_index = 0
+            for file, row_count in file_row_counts:
+                if row_count is None:
+                    # not cached, the file is read again on the next run
+                    file_rows[file] = list()
+                    continue
+                file_rows[file] = [{column: values[i] for column, values in columns.items()}
+                                   for i in range(row_index, row_index + row_count)]
+                row_index += row_count
+                cache.put(file, file_rows[file])
+        cache.prune(files_dir, files)
+        cache.close()
+        return pd.DataFrame([row for file in files for row in file_rows[file]])
+
+    def get_all_workbook_fields(self, workbooks_dir, processes=1, cache_file=None):
         """
         get all fields from workbooks found in given directory
 
         :param workbooks_dir:
+        :param processes: number of parser processes, None uses all cpus
+        :param cache_file: sqlite file caching field rows of parsed workbooks
         :return:
         """
         log.info("Extracting all workbook fields")
-        rows_list = []
+        return self._get_all_fields(PyTableau._workbook_field_rows, workbooks_dir, "twb", processes=processes,
+                                    cache_file=cache_file)
 
-        for root, _, filenames in os.walk(workbooks_dir):
-            for filename in filenames:
-                if "twb" in filename:
-                    # read metadata of workbook
-                    try:
-                        log.info("Processing %s " % filename)
-                        my_wb = tableaudocumentapi.workbook.Workbook(os.path.join(root, filename))
-                    except Exception:
-                        continue
-                    for myDS in my_wb.datasources:
-                        for _, field in myDS.fields.items():
-                            if len(field.worksheets) > 0:
-                                for myWorksheet in field.worksheets:
-                                    field_dict = self._field_dict(field, datasource=myDS, workbook=my_wb,
-                                                                  worksheet=myWorksheet)
-                                    rows_list.append(field_dict)
-                            else:
-                                field_dict = self._field_dict(field, datasource=myDS, workbook=my_wb)
-                                rows_list.append(field_dict)
-        return pd.DataFrame(rows_list)
-
-    def get_all_datasource_fields(self, datasource_dir):
+    def get_all_datasource_fields(self, datasource_dir, processes=1, cache_file=None):
         """
 
         :param datasource_dir:
+        :param processes: number of parser processes, None uses all cpus
+        :param cache_file: sqlite file caching field rows of parsed datasources
         :return:
         """
-        rows_list = []
-        for root, _, filenames in os.walk(datasource_dir):
-            for filename in filenames:
-                if "tds" in filename:
-                    log.info("Processing " + filename)
-                    # read metadata of workbook
-                    my_ds = tableaudocumentapi.datasource.Datasource.from_file(os.path.join(root, filename))
-                    for _, field in my_ds.fields.items():
-                        field_dict = self._field_dict(field, datasource=my_ds)
-                        rows_list.append(field_dict)
+        return self._get_all_fields(PyTableau._datasource_field_rows, datasource_dir, "tds", processes=processes,
+                                    cache_file=cache_file)
+
+    def iter_workbook_fields(self, workbooks_dir):
+        """
+        iterate fields of workbooks found in given directory, workbooks are parsed one at a time
 
-        return pd.DataFrame(rows_list)
+        :param workbooks_dir:
+        :return: iterator of field rows
+        """
+        for workbook_file in self._list_files(workbooks_dir, "twb"):
+            yield from self._workbook_field_rows(workbook_file)
 
-    def export_all_workbook_fields_to_csv(self, workbooks_dir):
+    def iter_datasource_fields(self, datasource_dir):
         """
+        iterate fields of datasources found in given directory, datasources are parsed one at a time
+
+        :param datasource_dir:
+        :return: iterator of field rows
+        """
+        for datasource_file in self._list_files(datasource_dir, "tds"):
+            yield from self._datasource_field_rows(datasource_file)
+
+    @staticmethod
+    def _metadata_field_dict(field: dict, datasource: dict, workbook: dict, worksheet=None):
+        """
+        field row of a Metadata API field with the columns of _field_dict
+
+        :param field:
+        :param datasource:
+        :param workbook:
+        :param worksheet:
+        :return:
+        """
+        # fields of published datasources are DatasourceField, their type attributes are on the remote field
+        remote_field = field.get('remoteField') or field
+        return {"field_name": PyTableauUtils.NoneToStr(field.get('name')),
+                "field_aggregation": PyTableauUtils.NoneToStr(remote_field.get('aggregation')),
+                "field_alias": '',
+                "field_calculation": PyTableauUtils.NoneToStr(remote_field.get('formula')),
+                # the api returns REAL, MEASURE, workbook files real, measure
+                "field_datatype": PyTableauUtils.NoneToStr(remote_field.get('dataType')).lower(),
+                "field_description": PyTableauUtils.NoneToStr(field.get('description')),
+                "field_id": PyTableauUtils.NoneToStr(field.get('fullyQualifiedName')),
+                "field_role": PyTableauUtils.NoneToStr(remote_field.get('role')).lower(),
+                "field_type": PyTableauUtils.NoneToStr(field.get('__typename')),
+                'data_source_name': PyTableauUtils.NoneToStr(datasource.get('name')),
+                'data_source_caption': PyTableauUtils.NoneToStr(datasource.get('name')),
+                'data_source_version': '', 'data_source_connections': '@TODO',
+                'workbook_name': PyTableauUtils.NoneToStr(workbook.get('name')),
+                'worksheet_name': PyTableauUtils.NoneToStr(worksheet)}
+
+    def iter_workbook_fields_from_metadata(self, page_size=100):
+        """
+        iterate fields of all workbooks using the Metadata API, without downloading workbooks
+
+        :param page_size: number of workbooks per query
+        :return: iterator of field rows
+        """
+        variables = {'first': page_size, 'afterToken': None}
+        while True:
+            result = self.server.metadata.query(self.WORKBOOK_FIELDS_QUERY, variables=variables)
+            if result.get('errors'):
+                raise Exception("Metadata API query failed %s" % result['errors'])
+            workbooks_connection = result['data']['workbooksConnection']
+            for workbook in workbooks_connection['nodes']:
+                for datasource in workbook.get('embeddedDatasources') or []:
+                    for field in datasource.get('fields') or []:
+                        worksheets = [sheet['name'] for sheet in field.get('downstreamSheets') or []]
+                        for worksheet in worksheets or [None]:
+                            yield self._metadata_field_dict(field, datasource=datasource, workbook=workbook,
+                                                            worksheet=worksheet)
+            if not workbooks_connection['pageInfo']['hasNextPage']:
+                break
+            variables['afterToken'] = workbooks_connection['pageInfo']['endCursor']
+
+    def get_all_workbook_fields_from_metadata(self, page_size=100):
+        """
+        get all workbook fields using the Metadata API
+
+        :param page_size: number of workbooks per query
+        :return: pandas DataFrame
+        """
+        log.info("Extracting all workbook fields from Metadata API")
+        pd = PyTableauUtils._require('pandas', purpose='get fields as DataFrame')
+        return pd.DataFrame(self.iter_workbook_fields_from_metadata(page_size=page_size))
+
+    def export_all_workbook_fields_to_csv(self, workbooks_dir, output_format='tsv', source='download') -> str:
+        """
+        stream fields of all workbooks into all_workbook_fields file of given directory
 
         :param workbooks_dir:
+        :param output_format: one of tsv, jsonl, parquet
+        :param source: download, to download all workbooks and parse them, or metadata to query the Metadata API
+        :return: field list file
         """
-        self.download_all_workbooks(download_dir=workbooks_dir)
-        field_list_file = workbooks_dir + '/all_workbook_fields.csv'
+        if output_format not in self.FIELD_FILE_EXTENSIONS:
+            raise Exception("Unexpected output_format '%s'!" % output_format)
+        if source == 'download':
+            self.download_all_workbooks(download_dir=workbooks_dir)
+            fields = self.iter_workbook_fields(workbooks_dir)
+        elif source == 'metadata':
+            fields = self.iter_workbook_fields_from_metadata()
+        else:
+            raise Exception("Unexpected source '%s'!" % source)
+        field_list_file = workbooks_dir + '/all_workbook_fields' + self.FIELD_FILE_EXTENSIONS[output_format]
         log.info("Putting all workbook fields into %s " % field_list_file)
-        df_wb_fields = self.get_all_workbook_fields(workbooks_dir)
-        df_wb_fields.to_csv(field_list_file, sep='\t', encoding='utf-8')
-        log.info("Created %s " % field_list_file)
+        row_count = PyTableauUtils.write_rows(field_list_file, fields, output_format=output_format)
+        log.info("Created %s with %s fields" % (field_list_file, row_count))
+        return field_list_file
 
-    def export_all_datasource_fields_to_csv(self, datasource_dir):
+    def export_all_datasource_fields_to_csv(self, datasource_dir, output_format='tsv') -> str:
         """
+        download all datasources and stream their fields into all_datasource_fields file of given directory
 
         :param datasource_dir:
+        :param output_format: one of tsv, jsonl, parquet
+        :return: field list file
         """
-        self.download_all_workbooks(download_dir=datasource_dir)
-        field_list_file = datasource_dir + '/all_datasource_fields.csv'
+        if output_format not in self.FIELD_FILE_EXTENSIONS:
+            raise Exception("Unexpected output_format '%s'!" % output_format)
+        self.download_all_datasources(download_dir=datasource_dir)
+        field_list_file = datasource_dir + '/all_datasource_fields' + self.FIELD_FILE_EXTENSIONS[output_format]
         log.info("Putting all datasource fields into %s " % (field_list_file,))
-        df_wb_fields = self.get_all_datasource_fields(datasource_dir)
-        df_wb_fields.to_csv(field_list_file, sep='\t', encoding='utf-8')
-        log.info("Created %s" % field_list_file)
+        row_count = PyTableauUtils.write_rows(field_list_file, self.iter_datasource_fields(datasource_dir),
+                                              output_format=output_format)
+        log.info("Created %s with %s fields" % (field_list_file, row_count))
+        return field_list_file
 
-    def _field_dict(self, field, datasource, workbook=None, worksheet=None):
+    @staticmethod
+    def _field_dict(field, datasource, workbook=None, worksheet=None):
         """
 
         :param field:
@@ -237,45 +1667,78 @@ class PyTableau():
         if worksheet:
             row['worksheet_name'] = PyTableauUtils.NoneToStr(worksheet)
         else:
-            row['workbook_name'] = ''
+            row['worksheet_name'] = ''
 
         return row
 
     def refresh_extracts(self, datasource_names, retry_attempt=2, synchronous=False,
-                         project_name_contains: list = None):
+                         project_name_contains: list = None, timeout=None, max_in_flight=None,
+                         max_server_jobs=None, dependencies: dict = None, discover_dependencies=False,
+                         job_tracker: PyTableauJobTracker = None):
         """
 
         :param synchronous:
         :param datasource_names:
         :param retry_attempt:
+        :param timeout: seconds to wait for the refresh jobs when synchronous
+        :param max_in_flight: submit refreshes concurrently through PyTableauRefreshScheduler keeping at most
+            max_in_flight refresh jobs running, refreshes are always waited for in this mode
+        :param max_server_jobs: with max_in_flight, hold new refreshes while the server has max_server_jobs jobs in
+            progress
+        :param dependencies: dict of datasource/workbook id or name to names it depends on, each item is refreshed as
+            soon as its dependencies are refreshed successfully. refreshes are always waited for in this mode
+        :param discover_dependencies: add dependencies of workbooks on published datasources given in datasource_names
+        :param job_tracker: PyTableauJobTracker waiting for the refresh jobs, sets the polling interval
         """
+        job_tracker = job_tracker or PyTableauJobTracker(self.server)
         log.info("Refreshing %s on %s " % (str(datasource_names), self.server.server_address))
 
+        item_names = list(datasource_names)
         datasource_names = [item.lower() for item in datasource_names]
         item_list_immutable_copy = datasource_names.copy()
         item_list_server = dict()
+        items_to_refresh = list()
         extract_refresh_jobs = dict()
+        failed_extract_refresh_jobs = dict()
+
+        def _log_job(key, job):
+            if PyTableauJobTracker.is_succeeded(job):
+                log.info("%s extractRefresh Succeeded %s " % (key, str(job)))
+                log.info("%s extractRefresh Succeeded in %s " % (key, (job.completed_at - job.started_at)))
+            else:
+                log.error("%s extractRefresh Failed %s " % (key, str(job)))
+                log.error("%s extractRefresh Failed in %s " % (key, (job.completed_at - job.started_at)))
+                failed_extract_refresh_jobs[key] = job
+
+        # get matching datasources and workbooks from server
+        for item in self.get_items_by_names(names=item_names, project_name_contains=project_name_contains):
+            item_list_server[item.id] = item
 
-        # get all datasources from server
-        ds: DatasourceItem
-        for ds in TSC.Pager(self.server.datasources):
-            if project_name_contains is None:
-                item_list_server[ds.id] = ds
-            elif any(project in str(ds.project_name) for project in project_name_contains):
-                item_list_server[ds.id] = ds
-
-        # get all workbooks from server
-        wb: WorkbookItem
-        for wb in TSC.Pager(self.server.datasources):
-            if project_name_contains is None:
-                item_list_server[wb.id] = wb
-            elif any(project in str(wb.project_name) for project in project_name_contains):
-                item_list_server[wb.id] = wb
-
-        # loop over server datasources and refresh if its name found in given DS list
         for item in item_list_server.values():
-            try:
-                if item.name.lower() in item_list_immutable_copy:
+            if item.name.lower() in item_list_immutable_copy:
+                items_to_refresh.append(item)
+                if item.name.lower() in datasource_names:
+                    datasource_names.remove(item.name.lower())
+
+        if len(datasource_names) > 0:
+            log.error("Following Datasources/Workbooks are not found on the server! %s " % str(datasource_names))
+
+        if max_in_flight or dependencies or discover_dependencies:
+            refresh_scheduler = PyTableauRefreshScheduler(self, max_in_flight=max_in_flight or 4,
+                                                          max_server_jobs=max_server_jobs, retry_attempt=retry_attempt,
+                                                          job_tracker=job_tracker)
+            dependencies = dict(dependencies or dict())
+            if discover_dependencies:
+                for item_id, upstream in refresh_scheduler.discover_dependencies(items_to_refresh).items():
+                    dependencies[item_id] = list(dependencies.get(item_id, list())) + upstream
+            log.info("Running extractRefresh Jobs, at most %s at the same time" % refresh_scheduler.max_in_flight)
+            _, failed_submissions = refresh_scheduler.run(items_to_refresh, timeout=timeout, on_complete=_log_job,
+                                                          dependencies=dependencies)
+            failed_extract_refresh_jobs.update(failed_submissions)
+        else:
+            # loop over server datasources and refresh if its name found in given DS list
+            for item in items_to_refresh:
+                try:
                     log.info('Starting extractRefresh Job for "%s" ' % item.name)
                     if isinstance(item, WorkbookItem):
                         refresh_job = self.refresh_workbook(wb_item=item, attempt=retry_attempt)
@@ -283,47 +1746,73 @@ class PyTableau():
                         refresh_job = self.refresh_extract(ds_item=item, attempt=retry_attempt)
                     if refresh_job:
                         extract_refresh_jobs[item.name + ':' + refresh_job.id] = refresh_job
-                    datasource_names.remove(item.name.lower())
-            except Exception as e:
-                log.warning(str(e).strip())
+                except Exception as e:
+                    log.warning(str(e).strip())
 
-        if len(datasource_names) > 0:
-            log.error("Following Datasources/Workbooks are not found on the server! %s " % str(datasource_names))
+            if synchronous is True and len(extract_refresh_jobs) > 0:
+                log.info("Waiting for extractRefresh Jobs to Finish!")
+                job_tracker.wait(extract_refresh_jobs, timeout=timeout, on_complete=_log_job)
+
+        if len(failed_extract_refresh_jobs) > 0:
+            raise Exception(
+                "Following extractRefresh Jobs are Failed \n[%s]!" % ','.join(failed_extract_refresh_jobs.keys()))
 
-        if synchronous is True and len(extract_refresh_jobs) > 0:
-            failed_extract_refresh_jobs = dict()
-            extract_refresh_jobs_immutable_copy = extract_refresh_jobs.copy()
-            log.info("Waiting for extractRefresh Jobs to Finish!")
-            while len(extract_refresh_jobs) > 0:
-                time.sleep(300)
-                for key, _job in extract_refresh_jobs_immutable_copy.items():
-                    if key in extract_refresh_jobs.keys():  # if its not yet finished!
-                        time.sleep(5)
-                        job = self.server.jobs.get_by_id(_job.id)
-                        if job.completed_at is not None:
-                            if job.finish_code == '0':
-                                log.info("%s extractRefresh Succeeded %s " % (key, str(job)))
-                                log.info(
-                                    "%s extractRefresh Succeeded in %s " % (key, (job.completed_at - job.started_at)))
-                            else:
-                                log.error("%s extractRefresh Failed %s " % (key, str(job)))
-                                log.error(
-                                    "%s extractRefresh Failed in %s " % (key, (job.completed_at - job.started_at)))
-                                failed_extract_refresh_jobs[key] = job
-                            extract_refresh_jobs.pop(key)
-                        else:
-                            log.info("%s extractRefresh Running %s " % (key, str(job)))
-
-            if len(failed_extract_refresh_jobs) > 0:
-                raise Exception(
-                    "Following extractRefresh Jobs are Failed \n[%s]!" % ','.join(failed_extract_refresh_jobs.keys()))
-
-    def refresh_extract(self, ds_item, attempt=1, current_attempt=1):
+    def get_items_by_names(self, names: list, project_name_contains: list = None, batch_size=20) -> list:
+        """
+        find datasources and workbooks with given names using server side name filters. names are requested in
+        batches and datasources and workbooks are paged concurrently. names are matched case insensitive on both the
+        catalog and the server path, names the exact match filters miss are looked up listing all items
+
+        :param names:
+        :param project_name_contains: keep only items whose project name contains one of given values
+        :param batch_size: number of names per request
+        :return: list of DatasourceItem and WorkbookItem
+        """
+        names = list(dict.fromkeys(names))
+        # names are matched case insensitive like refresh_extracts does
+        lower_names = {name.lower() for name in names}
+        if self.catalog is not None:
+            return [item for content_type in ('datasource', 'workbook')
+                    for item in self.catalog.items(content_type) if item.name.lower() in lower_names
+                    and (project_name_contains is None
+                         or any(project in str(item.project_name) for project in project_name_contains))]
+
+        # ',' and ']' can not be used inside an 'in' filter value list, such names are requested one by one
+        in_names = [name for name in names if ',' not in name and ']' not in name]
+        name_filters = [TSC.Filter(TSC.RequestOptions.Field.Name, TSC.RequestOptions.Operator.In,
+                                   in_names[i:i + batch_size]) for i in range(0, len(in_names), batch_size)]
+        name_filters += [TSC.Filter(TSC.RequestOptions.Field.Name, TSC.RequestOptions.Operator.Equals, name)
+                         for name in names if name not in in_names]
+
+        def _get_items(endpoint, name_filter, item_names):
+            req_option = TSC.RequestOptions()
+            if name_filter is not None:
+                req_option.filter.add(name_filter)
+            return [item for item in TSC.Pager(endpoint, request_opts=req_option)
+                    if item.name.lower() in item_names and (project_name_contains is None or any(
+                        project in str(item.project_name) for project in project_name_contains))]
+
+        endpoints = (self.server.datasources, self.server.workbooks)
+        with ThreadPoolExecutor(max_workers=max(min(len(name_filters) * 2, 8), 1)) as executor:
+            futures = [executor.submit(_get_items, endpoint, name_filter, lower_names)
+                       for endpoint in endpoints for name_filter in name_filters]
+            items = [item for future in futures for item in future.result()]
+            # server name filters are exact, look up names given in another case in the full item lists
+            missing_names = lower_names - {item.name.lower() for item in items}
+            if missing_names:
+                log.info("Listing all items to find %s" % str(sorted(missing_names)))
+                found_ids = {item.id for item in items}
+                futures = [executor.submit(_get_items, endpoint, None, missing_names) for endpoint in endpoints]
+                items += [item for future in futures for item in future.result() if item.id not in found_ids]
+            return items
+
+    def refresh_extract(self, ds_item, attempt=1, current_attempt=1, retry_wait=5):
         """
 
         :param ds_item:
         :param attempt:
         :param current_attempt:
+        :param retry_wait: seconds to wait before the first retry, doubled on each retry up to 300 seconds
         :return:
         """
         try:
@@ -334,31 +1823,34 @@ class PyTableau():
                 raise e
             else:
                 current_attempt = current_attempt + 1
-                time.sleep(5)
+                time.sleep(min(retry_wait * 2 ** (current_attempt - 2), 300))
                 log.debug(str(e))
                 log.info("Refreshing '%s' failed Trying %s th time" % (ds_item.name, str(current_attempt)))
-                return self.refresh_extract(ds_item=ds_item, attempt=attempt, current_attempt=current_attempt)
+                return self.refresh_extract(ds_item=ds_item, attempt=attempt, current_attempt=current_attempt,
+                                            retry_wait=retry_wait)
 
-    def refresh_workbook(self, wb_item, attempt=1, current_attempt=1):
+    def refresh_workbook(self, wb_item, attempt=1, current_attempt=1, retry_wait=5):
         """
 
         :param wb_item:
         :param attempt:
         :param current_attempt:
+        :param retry_wait: seconds to wait before the first retry, doubled on each retry up to 300 seconds
         :return:
         """
         try:
-            results = self.server.datasources.refresh(wb_item)
+            results = self.server.workbooks.refresh(wb_item)
             return results
         except Exception as e:
             if current_attempt >= attempt:
                 raise e
             else:
                 current_attempt = current_attempt + 1
-                time.sleep(5)
+                time.sleep(min(retry_wait * 2 ** (current_attempt - 2), 300))
                 log.debug(str(e))
                 log.info("Refreshing '%s' failed Trying %s th time" % (wb_item.name, str(current_attempt)))
-                return self.refresh_workbook(wb_item=wb_item, attempt=attempt, current_attempt=current_attempt)
+                return self.refresh_workbook(wb_item=wb_item, attempt=attempt, current_attempt=current_attempt,
+                                             retry_wait=retry_wait)
 
     def get_workbook_views(self, workbook_id):  # -> Iterable of views
         """
@@ -370,6 +1862,74 @@ class PyTableau():
         self.server.workbooks.populate_views(workbook)
         return workbook.views
 
+    def _iter_views(self, views, download_view, dest_dir, view_filters, max_workers=1, timeout=None):
+        """
+        download given views using download_view function and yield the results in the original view order. when
+        max_workers > 1 views are exported in parallel, at most 2 * max_workers results are held ahead
+
+        :param views:
+        :param download_view: one of _download_view_pdf, _download_view_png, _download_view_csv, _fetch_view_pdf
+        :param dest_dir:
+        :param view_filters:
+        :param max_workers: number of views exported concurrently
+        :param timeout: request timeout of the view exports, seconds the server may take to connect and to send data.
+            a timed out export raises TimeoutError, views not yet started are cancelled and running exports are
+            awaited, they end within timeout too, so no file is written into dest_dir afterwards
+        """
+        views = list(views)
+        _file_type = download_view.__name__.rsplit('_', 1)[-1]
+
+        def _render(_view, dest_dir, view_filters):
+            with metrics.timer('render', file_type=_file_type), self._request_timeout(timeout):
+                try:
+                    return download_view(_view, dest_dir=dest_dir, view_filters=view_filters)
+                except requests.exceptions.Timeout as e:
+                    raise TimeoutError("Exporting View:%s  Id:%s timed out after %s seconds" % (
+                        _view.name, _view.id, timeout)) from e
+
+        if max_workers is None or max_workers <= 1:
+            for _view in views:
+                yield _render(_view, dest_dir=dest_dir, view_filters=view_filters)
+            return
+
+        max_workers = max(max_workers or 1, 1)
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+        futures = list()
+        try:
+            for i, _view in enumerate(views):
+                for _next_view in views[len(futures):i + 2 * max_workers]:
+                    futures.append(executor.submit(_render, _next_view, dest_dir=dest_dir,
+                                                   view_filters=view_filters))
+                yield futures[i].result()
+                # release the result
+                futures[i] = None
+        finally:
+            for future in futures:
+                if future is not None:
+                    future.cancel()
+            # wait for running exports, dest_dir may be removed by the caller right after
+            executor.shutdown(wait=True)
+
+    @contextmanager
+    def _request_timeout(self, timeout):
+        """
+        apply timeout to the requests of the current thread, see PyTableauThreadSessions.request_timeout
+        """
+        if timeout is None or not isinstance(self.server._session, PyTableauThreadSessions):
+            yield
+            return
+        with self.server._session.request_timeout(timeout):
+            yield
+
+    def _download_views(self, views, download_view, dest_dir, view_filters, max_workers=1, timeout=None) -> list:
+        """
+        download given views, see _iter_views
+
+        :return: list of downloaded files in the original view order
+        """
+        return list(self._iter_views(views, download_view, dest_dir=dest_dir, view_filters=view_filters,
+                                     max_workers=max_workers, timeout=timeout))
+
     def _download_view_pdf(self, view: ViewItem, dest_dir,
                            view_filters: PDFRequestOptions = None):  # -> Filename to downloaded pdf
         log.debug("Exporting View:%s  Id:%s" % (view.name, view.id))
@@ -381,15 +1941,28 @@ class PyTableau():
 
         return destination_filename
 
+    def _fetch_view_pdf(self, view: ViewItem, dest_dir=None,
+                        view_filters: PDFRequestOptions = None):  # -> pdf bytes
+        log.debug("Exporting View:%s  Id:%s" % (view.name, view.id))
+        self.server.views.populate_pdf(view_item=view, req_options=view_filters)
+        return view.pdf
+
     def download_workbook_pdf(self, workbook: WorkbookItem, dest_dir, data_filters: dict = None, page_type=None,
-                              orientation=None):
+                              orientation=None, max_workers=1, timeout=None, stream=False):
         """
 
         :param workbook:
         :param dest_dir:
+        :param max_workers: number of views exported concurrently
+        :param timeout: request timeout of each view export in seconds, see _iter_views
+        :param stream: append view pdfs from memory to the output file as they are exported, without writing view
+            pdf files. peak memory grows with the largest view instead of the whole workbook
         :return:
         """
-        self.server.workbooks.populate_views(workbook)
+        with metrics.timer('list'):
+            self.server.workbooks.populate_views(workbook)
+
+        PyPDF3 = PyTableauUtils._require('PyPDF3', purpose='export pdf')
 
         _pdf_merger = PyPDF3.PdfFileMerger()
         _is_pdf_content_generated = False
@@ -406,14 +1979,28 @@ class PyTableau():
             "Exporting\nWorbook='%s' \nProject='%s' \nPage Type='%s' \nOrientation='%s' \nFilters='%s'\nFile='%s' " % (
                 workbook.name, workbook.project_name, page_type, orientation, _vw_filters.view_filters, _pdf_file))
 
-        for _view in workbook.views:
-            _downloaded_wv = self._download_view_pdf(_view, dest_dir=os.path.join(dest_dir, 'views'),
-                                                     view_filters=_vw_filters)
-            _pdf_merger.append(_downloaded_wv)
+        if stream:
+            with PyTableauPdfWriter(_pdf_file) as _pdf_writer:
+                for _view_pdf in self._iter_views(workbook.views, self._fetch_view_pdf, dest_dir=None,
+                                                  view_filters=_vw_filters, max_workers=max_workers, timeout=timeout):
+                    with metrics.timer('merge', file_type='pdf'):
+                        _pdf_writer.append(_view_pdf)
+            if not _pdf_writer.num_pages:
+                os.remove(_pdf_file)
+                raise Exception("No Pdf Content Generated")
+            log.info("Exported Workbook to pdf %s" % _pdf_file)
+            return _pdf_file
+
+        for _downloaded_wv in self._download_views(workbook.views, self._download_view_pdf,
+                                                   dest_dir=os.path.join(dest_dir, 'views'), view_filters=_vw_filters,
+                                                   max_workers=max_workers, timeout=timeout):
+            with metrics.timer('merge', file_type='pdf'):
+                _pdf_merger.append(_downloaded_wv)
             _is_pdf_content_generated = True
         if _is_pdf_content_generated:
-            _pdf_merger.write(_pdf_file)
-            _pdf_merger.close()
+            with metrics.timer('merge', file_type='pdf'):
+                _pdf_merger.write(_pdf_file)
+                _pdf_merger.close()
             log.info("Exported Workbook to pdf %s" % _pdf_file)
         else:
             raise Exception("No Pdf Content Generated")
@@ -430,21 +2017,44 @@ class PyTableau():
 
         return destination_filename
 
-    def _img_concat_v_multi_resize(self, im_list, resample=Image.BICUBIC):
-        min_width = min(im.width for im in im_list)
-        im_list_resize = [im.resize((min_width, int(im.height * min_width / im.width)), resample=resample)
-                          for im in im_list]
-        total_height = sum(im.height for im in im_list_resize)
-        dst = Image.new('RGB', (min_width, total_height))
+    def _img_concat_v_files(self, img_files, max_pixels=None, resample=None):
+        """
+        concat images vertically resizing them to the minimum width. images are decoded, resized and pasted one at a
+        time into a preallocated output image
+
+        :param img_files:
+        :param max_pixels: output image is downscaled to fit in max_pixels
+        :param resample: PIL resampling filter, BICUBIC by default
+        :return: concatenated image
+        """
+        Image = PyTableauUtils._require('PIL.Image', 'Pillow', purpose='export png')
+        resample = Image.BICUBIC if resample is None else resample
+        sizes = list()
+        for img_file in img_files:
+            # reads image header only
+            with Image.open(img_file) as im:
+                sizes.append(im.size)
+
+        min_width = min(width for width, _ in sizes)
+        total_height = sum(int(height * min_width / width) for width, height in sizes)
+        if max_pixels and min_width * total_height > max_pixels:
+            scale = math.sqrt(max_pixels / (min_width * total_height))
+            log.info("Downscaling %sx%s image by %.2f to fit in %s pixels" % (min_width, total_height, scale,
+                                                                             max_pixels))
+            min_width = max(int(min_width * scale), 1)
+
+        heights = [max(int(height * min_width / width), 1) for width, height in sizes]
+        dst = Image.new('RGB', (min_width, sum(heights)))
         pos_y = 0
-        for im in im_list_resize:
-            dst.paste(im, (0, pos_y))
-            pos_y += im.height
+        for img_file, height in zip(img_files, heights):
+            with Image.open(img_file) as im:
+                dst.paste(im.resize((min_width, height), resample=resample), (0, pos_y))
+            pos_y += height
         return dst
 
     def download_workbook_png(self, workbook: WorkbookItem, dest_dir, data_filters: dict = None,
                               imageresolution=None,
-                              maxage=-1) -> str:
+                              maxage=-1, max_workers=1, timeout=None, max_pixels=None) -> str:
         """
 
         :param workbook:
@@ -452,11 +2062,14 @@ class PyTableau():
         :param data_filters:
         :param imageresolution:
         :param maxage:
+        :param max_workers: number of views exported concurrently
+        :param timeout: request timeout of each view export in seconds, see _iter_views
+        :param max_pixels: downscale the exported image to fit in max_pixels
         :return:
         """
-        self.server.workbooks.populate_views(workbook)
+        with metrics.timer('list'):
+            self.server.workbooks.populate_views(workbook)
 
-        _img_list = list()
         _img_file = os.path.join(dest_dir, workbook.name) + ".png"
         _vw_filters = ImageRequestOptions(imageresolution=imageresolution, maxage=maxage)
 
@@ -470,13 +2083,13 @@ class PyTableau():
             "Exporting\nWorbook='%s' \nProject='%s' \nFilters='%s'\nFile='%s' " % (
                 workbook.name, workbook.project_name, _vw_filters.view_filters, _img_file))
 
-        for _view in workbook.views:
-            _downloaded_wv = self._download_view_png(_view, dest_dir=os.path.join(dest_dir, 'views'),
-                                                     view_filters=_vw_filters)
-            _img_list.append(Image.open(_downloaded_wv))
+        _img_files = self._download_views(workbook.views, self._download_view_png,
+                                          dest_dir=os.path.join(dest_dir, 'views'), view_filters=_vw_filters,
+                                          max_workers=max_workers, timeout=timeout)
 
-        if _img_list:
-            self._img_concat_v_multi_resize(im_list=_img_list).save(_img_file)
+        if _img_files:
+            with metrics.timer('merge', file_type='png'):
+                self._img_concat_v_files(img_files=_img_files, max_pixels=max_pixels).save(_img_file)
             log.info("Exported Workbook to png %s" % _img_file)
         else:
             raise Exception("No Image Content Generated")
@@ -495,18 +2108,36 @@ class PyTableau():
 
         return destination_filename
 
-    def download_workbook_csv(self, workbook: WorkbookItem, dest_dir, data_filters: dict = None) -> str:
+    def _stream_view_csv(self, view: ViewItem, view_filters: CSVRequestOptions = None):  # -> csv byte chunks
+        log.debug("Exporting View:%s  Id:%s" % (view.name, view.id))
+        self.server.views.populate_csv(view_item=view, req_options=view_filters)
+        yield from view.csv
+
+    def download_workbook_csv(self, workbook: WorkbookItem, dest_dir, data_filters: dict = None, max_workers=1,
+                              timeout=None, output_format='xlsx') -> str:
         """
+        export workbook views as excel sheets, or as a zip bundle of parquet or gzip csv files. view data is streamed
+        into the output file, when views are exported in parallel view csv files are spooled to disk first
 
         :param workbook:
         :param dest_dir:
         :param data_filters:
+        :param max_workers: number of views exported concurrently
+        :param timeout: request timeout of each view export in seconds, see _iter_views
+        :param output_format: one of xlsx, parquet, csv.gz
         :return:
         """
-        self.server.workbooks.populate_views(workbook)
+        _writers = {'xlsx': (PyTableauUtils.write_xlsx, ".xlsx"),
+                    'parquet': (PyTableauUtils.write_parquet_bundle, ".parquet.zip"),
+                    'csv.gz': (PyTableauUtils.write_csv_gz_bundle, ".csv.zip")}
+        if output_format not in _writers:
+            raise Exception("Unexpected output_format '%s'!" % output_format)
+        _writer, _extension = _writers[output_format]
+
+        with metrics.timer('list'):
+            self.server.workbooks.populate_views(workbook)
 
-        _csv_list = list()
-        _excel_file = os.path.join(dest_dir, workbook.name) + ".xlsx"
+        _out_file = os.path.join(dest_dir, workbook.name) + _extension
         _vw_filters = CSVRequestOptions()
 
         if data_filters is None:
@@ -517,42 +2148,46 @@ class PyTableau():
 
         log.info(
             "Exporting\nWorbook='%s' \nProject='%s' \nFilters='%s'\nFile='%s' " % (
-                workbook.name, workbook.project_name, _vw_filters.view_filters, _excel_file))
-
-        for _view in workbook.views:
-            _downloaded_wv = self._download_view_csv(_view, dest_dir=os.path.join(dest_dir, 'views'),
-                                                     view_filters=_vw_filters)
-            _csv_list.append(_downloaded_wv)
-
-        if _csv_list:
-            wb = Workbook()
-            # remove default work sheet
-            wb.remove(wb.active)
-            for _csv in _csv_list:
-                _ws_name = Path(_csv).stem
-                _ws = wb.create_sheet(_ws_name)
-                with open(_csv) as csv_file:
-                    csv_reader = csv.reader(csv_file, delimiter=',')
-                    for row in csv_reader:
-                        _ws.append(row)
-
-            wb.save(_excel_file)
-            wb.close()
-            log.info("Exported Workbook to Excel %s" % _excel_file)
+                workbook.name, workbook.project_name, _vw_filters.view_filters, _out_file))
+
+        if (max_workers is None or max_workers <= 1) and timeout is None:
+            _view_csvs = ((_view.name, self._stream_view_csv(_view, view_filters=_vw_filters))
+                          for _view in workbook.views)
+        else:
+            _view_csvs = ((Path(_csv).stem, PyTableauUtils.iter_file_chunks(_csv))
+                          for _csv in self._download_views(workbook.views, self._download_view_csv,
+                                                           dest_dir=os.path.join(dest_dir, 'views'),
+                                                           view_filters=_vw_filters, max_workers=max_workers,
+                                                           timeout=timeout))
+
+        # sequential exports are streamed, writing includes rendering the views
+        with metrics.timer('merge', file_type=output_format):
+            _written = _writer(_out_file, _view_csvs)
+        if _written:
+            log.info("Exported Workbook to %s %s" % (output_format, _out_file))
         else:
+            if os.path.exists(_out_file):
+                os.remove(_out_file)
             raise Exception("No CSV Content Generated")
 
-        return _excel_file
+        return _out_file
 
     def download_workbook(self, file_type: str, workbook: WorkbookItem, dest_dir, data_filters: dict = None,
-                          page_type=None, orientation=None):
+                          page_type=None, orientation=None, max_workers=1, timeout=None):
         if file_type.lower() == "pdf":
             return self.download_workbook_pdf(workbook=workbook, dest_dir=dest_dir, data_filters=data_filters,
-                                              page_type=page_type, orientation=orientation)
+                                              page_type=page_type, orientation=orientation,
+                                              max_workers=max_workers, timeout=timeout)
         elif file_type.lower() == "png":
-            return self.download_workbook_png(workbook=workbook, dest_dir=dest_dir, data_filters=data_filters)
+            return self.download_workbook_png(workbook=workbook, dest_dir=dest_dir, data_filters=data_filters,
+                                              max_workers=max_workers, timeout=timeout)
         elif file_type.lower() == "csv":
-            return self.download_workbook_csv(workbook=workbook, dest_dir=dest_dir, data_filters=data_filters)
+            return self.download_workbook_csv(workbook=workbook, dest_dir=dest_dir, data_filters=data_filters,
+                                              max_workers=max_workers, timeout=timeout)
+        elif file_type.lower() in ("parquet", "csv.gz"):
+            return self.download_workbook_csv(workbook=workbook, dest_dir=dest_dir, data_filters=data_filters,
+                                              max_workers=max_workers, timeout=timeout,
+                                              output_format=file_type.lower())
         else:
             raise Exception("Unexpected download file_type '%s'!" % file_type)
 
@@ -580,8 +2215,11 @@ class PyTableau():
         :param tag:
         :return:
         """
-        req_option = self._get_request_option(name=name, project_name=project_name, tag=tag)
-        all_items, pagination_item = self.server.workbooks.get(req_options=req_option)
+        if self.catalog is not None:
+            all_items = self.catalog.find('workbook', name=name, project_name=project_name, tag=tag)
+        else:
+            req_option = self._get_request_option(name=name, project_name=project_name, tag=tag)
+            all_items, pagination_item = self.server.workbooks.get(req_options=req_option)
         if not all_items:
             raise LookupError("No Workbook with given parameters (name:'%s', project:'%s', tag:'%s') found!" % (
                 name, project_name, tag))
@@ -598,8 +2236,11 @@ class PyTableau():
         :param project_name:
         :return:
         """
-        req_option = self._get_request_option(tag=tag, project_name=project_name)
-        all_items, pagination_item = self.server.workbooks.get(req_options=req_option)
+        if self.catalog is not None:
+            all_items = self.catalog.find('workbook', project_name=project_name, tag=tag)
+        else:
+            req_option = self._get_request_option(tag=tag, project_name=project_name)
+            all_items = list(TSC.Pager(self.server.workbooks, request_opts=req_option))
         if not all_items:
             raise LookupError("No Workbook with given parameters found!")
 
@@ -613,9 +2254,11 @@ class PyTableau():
         :param tag:
         :return:
         """
-        req_option = self._get_request_option(name=name, project_name=project_name, tag=tag)
-
-        all_items, pagination_item = self.server.datasources.get(req_options=req_option)
+        if self.catalog is not None:
+            all_items = self.catalog.find('datasource', name=name, project_name=project_name, tag=tag)
+        else:
+            req_option = self._get_request_option(name=name, project_name=project_name, tag=tag)
+            all_items, pagination_item = self.server.datasources.get(req_options=req_option)
         if not all_items:
             raise LookupError("No Datasource with given parameters found!")
         if len(all_items) > 1:
@@ -628,12 +2271,16 @@ class PyTableau():
 
         :param name:
         :param parant_project_name:
-        :param tag:
+        :param tag: not used, projects have no tags
         :return:
         """
-        req_option = self._get_request_option(name=name, project_name=parant_project_name, tag=tag)
-
-        all_items, pagination_item = self.server.datasources.get(req_options=req_option)
+        parent_id = self.get_project_by_name(parant_project_name).id if parant_project_name else None
+        if self.catalog is not None:
+            all_items = self.catalog.find('project', name=name, parent_id=parent_id)
+        else:
+            req_option = self._get_request_option(name=name)
+            all_items = [item for item in TSC.Pager(self.server.projects, request_opts=req_option)
+                         if parent_id is None or item.parent_id == parent_id]
         if not all_items:
             raise LookupError("No Project with given parameters found!")
         if len(all_items) > 1:
@@ -641,53 +2288,868 @@ class PyTableau():
 
         return all_items.pop()
 
+    def _scan_connections(self, endpoint, resources, max_workers=1, rate_limiter=None, retry_attempt=1) -> list:
+        """
+        populate connections of given resources concurrently, resources failing to populate are logged and returned
+        with None connections
+
+        :param endpoint: self.server.workbooks or self.server.datasources
+        :param resources:
+        :param max_workers:
+        :param rate_limiter: PyTableauRateLimiter limiting populate calls
+        :param retry_attempt: number of populate attempts per resource
+        :return: list of (resource, connections), connections is None when populating failed
+        """
+
+        def _populate(resource):
+            try:
+                if rate_limiter is not None:
+                    rate_limiter.wait()
+                PyTableauUtils.retry(endpoint.populate_connections, resource, attempt=retry_attempt)
+                log.debug("Scanned Connections for '%s' " % str(resource.name))
+                return resource, list(resource.connections)
+            except Exception as e:
+                log.warning("Failed to scan Connections of '%s' %s" % (resource.name, str(e).strip()))
+                return resource, None
+
+        with ThreadPoolExecutor(max_workers=max(max_workers, 1)) as executor:
+            return list(executor.map(_populate, resources))
+
+    def build_connection_index(self, index_file=None, max_workers=8, full=False):
+        """
+        build or incrementally refresh the connection index of datasources and workbooks
+
+        :param index_file: json file the index is loaded from and saved to
+        :param max_workers: number of items scanned concurrently
+        :param full: rescan every item instead of only new or updated ones
+        :return: PyTableauConnectionIndex
+        """
+        index = PyTableauConnectionIndex(index_file=index_file)
+        index.refresh(self, max_workers=max_workers, full=full)
+        return index
+
     def update_all_datasource_connections(self, curr_server_address, curr_username, new_server_address=None,
                                           new_server_port=None,
-                                          new_username=None, new_password=None, new_embed_password: bool = None):
+                                          new_username=None, new_password=None, new_embed_password: bool = None,
+                                          max_workers=1, rate_limit=None, checkpoint_file=None, dry_run=False):
+        """
+        see PyTableauConnectionMigration
+
+        :return: planned connection changes when dry_run, otherwise apply summary
+        """
         log.info('Updating "%s" Connections! server :' % str(self.server.server_address))
-        for resource in TSC.Pager(self.server.datasources):
-            self.server.datasources.populate_connections(resource)
-            log.debug("Updating Connections for '%s' " % str(resource.name))
-            for conn in resource.connections:
-                if conn.server_address == curr_server_address and conn.username == curr_username:
-                    log.info("Updating Connection " + str(conn))
-                    if new_server_address is not None:
-                        conn.server_address = new_server_address
-                    if new_server_port is not None:
-                        conn.server_port = new_server_port
-                    if new_username is not None:
-                        conn.username = new_username
-                    if new_password is not None:
-                        conn.password = new_password
-                    if new_embed_password is not None:
-                        conn.embed_password = True
-                    self.server.datasources.update_connection(resource, conn)
-                    log.info('Updated Connection of "%s"  server_address:%s username:%s ' % (
-                        resource.name, curr_server_address, curr_username))
+        return PyTableauConnectionMigration(self, curr_server_address=curr_server_address,
+                                            curr_username=curr_username, new_server_address=new_server_address,
+                                            new_server_port=new_server_port, new_username=new_username,
+                                            new_password=new_password, new_embed_password=new_embed_password,
+                                            max_workers=max_workers, rate_limit=rate_limit,
+                                            checkpoint_file=checkpoint_file).run(content_types=['datasource'],
+                                                                                 dry_run=dry_run)
 
     def update_all_workbook_connections(self, curr_server_address, curr_username, new_server_address=None,
                                         new_server_port=None,
-                                        new_username=None, new_password=None, new_embed_password: bool = None):
+                                        new_username=None, new_password=None, new_embed_password: bool = None,
+                                        max_workers=1, rate_limit=None, checkpoint_file=None, dry_run=False):
+        """
+        see PyTableauConnectionMigration
+
+        :return: planned connection changes when dry_run, otherwise apply summary
+        """
         log.info('Updating "%s" Connections! server :' % str(self.server.server_address))
-        for resource in TSC.Pager(self.server.workbooks):
-            self.server.workbooks.populate_connections(resource)
-            log.debug("Updating Connections for '%s' " % str(resource.name))
-            for conn in resource.connections:
-                if conn.server_address == curr_server_address and conn.username == curr_username:
-                    log.info("Updating Connection " + str(conn))
-                    if new_server_address is not None:
-                        conn.server_address = new_server_address
-                    if new_server_port is not None:
-                        conn.server_port = new_server_port
-                    if new_username is not None:
-                        conn.username = new_username
-                    if new_password is not None:
-                        conn.password = new_password
-                    if new_embed_password is not None:
-                        conn.embed_password = True
-                    self.server.workbooks.update_connection(resource, conn)
-                    log.info('Updated Connection of "%s"  server_address:%s username:%s ' % (
-                        resource.name, curr_server_address, curr_username))
+        return PyTableauConnectionMigration(self, curr_server_address=curr_server_address,
+                                            curr_username=curr_username, new_server_address=new_server_address,
+                                            new_server_port=new_server_port, new_username=new_username,
+                                            new_password=new_password, new_embed_password=new_embed_password,
+                                            max_workers=max_workers, rate_limit=rate_limit,
+                                            checkpoint_file=checkpoint_file).run(content_types=['workbook'],
+                                                                                 dry_run=dry_run)
+
+
+class PyTableauConnectionIndex():
+    """
+    index of datasource and workbook connections by server address, port, username and connection type. the index is
+    built with a server scan, persisted to a json file and refreshed incrementally using item updated_at. lookup
+    values are compared case insensitive
+    """
+    KEY_FIELDS = ('server_address', 'server_port', 'username', 'connection_type')
+
+    def __init__(self, index_file=None):
+        self.index_file = index_file
+        # "<content_type>:<item id>" -> item with its connections
+        self.items = dict()
+        # (key field, value) -> item keys and full connection key -> item keys
+        self._by_field = dict()
+        self._by_connection = dict()
+        if index_file and os.path.exists(index_file):
+            for item in PyTableauUtils.read_json(index_file, default=list()):
+                self._add(item)
+
+    @staticmethod
+    def _normalize(value):
+        return '' if value is None else str(value).lower()
+
+    def _connection_key(self, connection: dict) -> tuple:
+        return tuple(self._normalize(connection.get(field)) for field in self.KEY_FIELDS)
+
+    def _add(self, item: dict):
+        item_key = "%s:%s" % (item['content_type'], item['id'])
+        self._remove(item_key)
+        self.items[item_key] = item
+        for connection in item['connections']:
+            connection_key = self._connection_key(connection)
+            self._by_connection.setdefault(connection_key, set()).add(item_key)
+            for field, value in zip(self.KEY_FIELDS, connection_key):
+                self._by_field.setdefault((field, value), set()).add(item_key)
+
+    def _remove(self, item_key):
+        item = self.items.pop(item_key, None)
+        if item is None:
+            return
+        for connection in item['connections']:
+            connection_key = self._connection_key(connection)
+            self._by_connection.get(connection_key, set()).discard(item_key)
+            for field, value in zip(self.KEY_FIELDS, connection_key):
+                self._by_field.get((field, value), set()).discard(item_key)
+
+    def find(self, server_address=None, server_port=None, username=None, connection_type=None) -> list:
+        """
+        find items having a connection matching all given values
+
+        :param server_address:
+        :param server_port:
+        :param username:
+        :param connection_type:
+        :return: list of item dicts with content_type, id, name, project_name, updated_at and connections keys
+        """
+        values = dict(zip(self.KEY_FIELDS, (server_address, server_port, username, connection_type)))
+        if all(value is not None for value in values.values()):
+            item_keys = self._by_connection.get(self._connection_key(values), set())
+        else:
+            given_values = [(field, self._normalize(value)) for field, value in values.items() if value is not None]
+            if not given_values:
+                item_keys = set(self.items.keys())
+            else:
+                item_keys = set.intersection(*[self._by_field.get(field_value, set()) for field_value in given_values])
+        return [self.items[item_key] for item_key in sorted(item_keys)]
+
+    def refresh(self, tableau, content_types=('datasource', 'workbook'), max_workers=8, full=False) -> dict:
+        """
+        scan new and updated items, drop items removed from the server and save the index
+
+        :param tableau: PyTableau
+        :param content_types: datasource and/or workbook
+        :param max_workers: number of items scanned concurrently
+        :param full: rescan every item
+        :return: summary dict with number of scanned, unchanged, removed and failed items. items failing to scan keep
+            their previous connections and are scanned again on the next refresh
+        """
+        summary = {'scanned': 0, 'unchanged': 0, 'removed': 0, 'failed': 0}
+        for content_type in content_types:
+            endpoint = tableau.server.datasources if content_type == 'datasource' else tableau.server.workbooks
+            server_item_keys = set()
+            changed_resources = list()
+            for resource in TSC.Pager(endpoint):
+                item_key = "%s:%s" % (content_type, resource.id)
+                server_item_keys.add(item_key)
+                if not full and item_key in self.items \
+                        and self.items[item_key]['updated_at'] == str(resource.updated_at):
+                    summary['unchanged'] += 1
+                else:
+                    changed_resources.append(resource)
+
+            for resource, connections in tableau._scan_connections(endpoint, changed_resources,
+                                                                   max_workers=max_workers):
+                if connections is None:
+                    item_key = "%s:%s" % (content_type, resource.id)
+                    if item_key in self.items:
+                        self.items[item_key]['updated_at'] = None
+                    summary['failed'] += 1
+                    continue
+                self._add({'content_type': content_type, 'id': resource.id, 'name': resource.name,
+                           'project_name': resource.project_name, 'updated_at': str(resource.updated_at),
+                           'connections': [{'id': conn.id, 'server_address': conn.server_address,
+                                            'server_port': conn.server_port, 'username': conn.username,
+                                            'connection_type': conn.connection_type} for conn in connections]})
+                summary['scanned'] += 1
+
+            for item_key in [key for key, item in self.items.items()
+                             if item['content_type'] == content_type and key not in server_item_keys]:
+                self._remove(item_key)
+                summary['removed'] += 1
+
+        log.info("Connection index refreshed, %s scanned, %s unchanged, %s removed, %s failed" % (
+            summary['scanned'], summary['unchanged'], summary['removed'], summary['failed']))
+        self.save()
+        return summary
+
+    def save(self):
+        if self.index_file:
+            PyTableauUtils.write_json(self.index_file, list(self.items.values()))
+
+
+class PyTableauConnectionMigration():
+    """
+    rewrite connections of datasources and workbooks matching curr_server_address and curr_username in three phases.
+    scan builds the connection inventory concurrently, plan lists the connection changes (dry run) and apply updates
+    the connections in parallel with rate limiting, retries and a resumable checkpoint file
+    """
+
+    def __init__(self, tableau: PyTableau, curr_server_address, curr_username, new_server_address=None,
+                 new_server_port=None, new_username=None, new_password=None, new_embed_password: bool = None,
+                 max_workers=8, rate_limit=None, retry_attempt=3, checkpoint_file=None, index=None):
+        self.tableau = tableau
+        # PyTableauConnectionIndex limiting the scan to the items having the current connection
+        self.index = index
+        self.curr_server_address = curr_server_address
+        self.curr_username = curr_username
+        self.changes = {'server_address': new_server_address, 'server_port': new_server_port,
+                        'username': new_username, 'password': new_password, 'embed_password': new_embed_password}
+        self.max_workers = max(max_workers, 1)
+        self.rate_limiter = PyTableauRateLimiter(rate_limit)
+        self.retry_attempt = retry_attempt
+        self.checkpoint_file = checkpoint_file
+        self._checkpoint_lock = threading.Lock()
+        # "<content_type>:<item id>" -> error of items the last scan could not read
+        self.scan_failures = dict()
+
+    def _endpoint(self, content_type):
+        if content_type == 'datasource':
+            return self.tableau.server.datasources
+        elif content_type == 'workbook':
+            return self.tableau.server.workbooks
+        else:
+            raise Exception("Unexpected content_type '%s'!" % content_type)
+
+    def _call(self, func, *args):
+        self.rate_limiter.wait()
+        return PyTableauUtils.retry(func, *args, attempt=self.retry_attempt)
+
+    @staticmethod
+    def _checkpoint_key(content_type, resource, conn):
+        return "%s:%s:%s" % (content_type, resource.id, conn.id)
+
+    def _read_checkpoint(self) -> set:
+        if not self.checkpoint_file or not os.path.exists(self.checkpoint_file):
+            return set()
+        with open(self.checkpoint_file, encoding='utf-8') as f:
+            return {line.strip() for line in f if line.strip()}
+
+    def _write_checkpoint(self, key):
+        if not self.checkpoint_file:
+            return
+        with self._checkpoint_lock, open(self.checkpoint_file, 'a', encoding='utf-8') as f:
+            f.write(key + '\n')
+
+    def scan(self, content_types=('datasource', 'workbook')) -> list:
+        """
+        populate connections of all items concurrently. items that can not be read or scanned are kept in
+        scan_failures
+
+        :param content_types: datasource and/or workbook
+        :return: connection inventory, list of (content_type, resource, connection)
+        """
+        inventory = list()
+        self.scan_failures = dict()
+        for content_type in content_types:
+            endpoint = self._endpoint(content_type)
+            if self.index is None:
+                resources = list(TSC.Pager(endpoint))
+            else:
+                # scan only the items the index lists for the current connection
+                item_ids = [item['id'] for item in self.index.find(server_address=self.curr_server_address,
+                                                                   username=self.curr_username)
+                            if item['content_type'] == content_type]
+
+                def _get(item_id):
+                    try:
+                        return self._call(endpoint.get_by_id, item_id)
+                    except Exception as e:
+                        log.error('Failed to get %s "%s" %s' % (content_type, item_id, str(e).strip()))
+                        self.scan_failures["%s:%s" % (content_type, item_id)] = str(e).strip()
+
+                with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                    resources = [resource for resource in executor.map(_get, item_ids) if resource is not None]
+            for resource, connections in self.tableau._scan_connections(endpoint, resources,
+                                                                        max_workers=self.max_workers,
+                                                                        rate_limiter=self.rate_limiter,
+                                                                        retry_attempt=self.retry_attempt):
+                if connections is None:
+                    self.scan_failures["%s:%s" % (content_type, resource.id)] = \
+                        'Failed to scan Connections of "%s"' % resource.name
+                    continue
+                inventory.extend((content_type, resource, conn) for conn in connections)
+        log.info("Scanned %s connections, %s items failed" % (len(inventory), len(self.scan_failures)))
+        return inventory
+
+    def plan(self, inventory: list) -> list:
+        """
+        list connection changes, connections already updated according to the checkpoint file are skipped. server
+        address and username are compared case insensitive like PyTableauConnectionIndex. items the scan failed to
+        read are listed with resource_id and error keys, resource and connection are None
+
+        :param inventory: see scan
+        :return: list of dicts with content_type, resource, connection and changes keys
+        """
+        done = self._read_checkpoint()
+        plan = list()
+        curr_connection = (PyTableauConnectionIndex._normalize(self.curr_server_address),
+                           PyTableauConnectionIndex._normalize(self.curr_username))
+        for content_type, resource, conn in inventory:
+            if (PyTableauConnectionIndex._normalize(conn.server_address),
+                    PyTableauConnectionIndex._normalize(conn.username)) != curr_connection:
+                continue
+            if self._checkpoint_key(content_type, resource, conn) in done:
+                log.info('Skipping already updated Connection of "%s" %s' % (resource.name, str(conn)))
+                continue
+            changes = {attr: value for attr, value in self.changes.items() if value is not None}
+            plan.append({'content_type': content_type, 'resource': resource, 'connection': conn, 'changes': changes})
+            log.info('Planned Connection update of %s "%s" %s: %s' % (
+                content_type, resource.name, str(conn),
+                ', '.join("%s=%s" % (attr, '***' if attr == 'password' else value) for attr, value in
+                          changes.items())))
+        for key, error in self.scan_failures.items():
+            log.error("Not scanned %s %s" % (key, error))
+            content_type, resource_id = key.split(':', 1)
+            plan.append({'content_type': content_type, 'resource_id': resource_id, 'resource': None,
+                         'connection': None, 'changes': dict(), 'error': error})
+        log.info("Planned %s connection updates, %s items not scanned" % (len(plan) - len(self.scan_failures),
+                                                                          len(self.scan_failures)))
+        return plan
+
+    def apply(self, plan: list) -> dict:
+        """
+        update planned connections in parallel
+
+        :param plan: see plan
+        :return: summary dict, 'updated' number of updated connections and 'failed' dict of connection, or of item not
+            scanned, to error
+        """
+        summary = {'updated': 0, 'failed': dict()}
+        summary_lock = threading.Lock()
+
+        def _update(change):
+            if change.get('error') is not None:
+                with summary_lock:
+                    summary['failed']["%s:%s" % (change['content_type'], change['resource_id'])] = change['error']
+                return
+            resource, conn = change['resource'], change['connection']
+            key = self._checkpoint_key(change['content_type'], resource, conn)
+            try:
+                for attr, value in change['changes'].items():
+                    setattr(conn, attr, value)
+                self._call(self._endpoint(change['content_type']).update_connection, resource, conn)
+                self._write_checkpoint(key)
+                log.info('Updated Connection of "%s"  server_address:%s username:%s ' % (
+                    resource.name, self.curr_server_address, self.curr_username))
+                with summary_lock:
+                    summary['updated'] += 1
+            except Exception as e:
+                log.error('Failed to update Connection of "%s" %s' % (resource.name, str(e).strip()))
+                with summary_lock:
+                    summary['failed'][key] = str(e).strip()
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            list(executor.map(_update, plan))
+        log.info("Updated %s connections, %s failed" % (summary['updated'], len(summary['failed'])))
+        return summary
+
+    def run(self, content_types=('datasource', 'workbook'), dry_run=False):
+        """
+        scan, plan and apply connection changes
+
+        :param content_types: datasource and/or workbook
+        :param dry_run: only plan the changes
+        :return: plan when dry_run, otherwise apply summary
+        """
+        plan = self.plan(self.scan(content_types=content_types))
+        if dry_run:
+            return plan
+        return self.apply(plan)
+
+
+class PyTableauRefreshScheduler():
+    """
+    submit datasource and workbook refreshes concurrently. at most max_in_flight refresh jobs run at the same time and
+    new refreshes are held back while the server has max_server_jobs or more jobs in progress. failing submissions are
+    retried with exponential backoff
+    """
+
+    def __init__(self, tableau: PyTableau, max_in_flight=4, max_server_jobs=None, retry_attempt=3, retry_wait=5,
+                 job_tracker: PyTableauJobTracker = None):
+        self.tableau = tableau
+        self.max_in_flight = max(max_in_flight, 1)
+        self.max_server_jobs = max_server_jobs
+        self.retry_attempt = retry_attempt
+        self.retry_wait = retry_wait
+        self.job_tracker = job_tracker or PyTableauJobTracker(tableau.server)
+
+    def server_jobs_in_progress(self) -> int:
+        """
+
+        :return: number of jobs in progress on the server
+        """
+        req_option = TSC.RequestOptions(pagesize=1)
+        req_option.filter.add(TSC.Filter('status', TSC.RequestOptions.Operator.Equals, 'InProgress'))
+        _, pagination_item = self.tableau.server.jobs.get(req_options=req_option)
+        return int(pagination_item.total_available)
+
+    def _free_slots(self, in_flight) -> int:
+        slots = self.max_in_flight - in_flight
+        if slots > 0 and self.max_server_jobs is not None:
+            try:
+                slots = min(slots, self.max_server_jobs - self.server_jobs_in_progress())
+            except Exception as e:
+                log.warning("Failed to get server jobs in progress %s" % str(e).strip())
+        return max(slots, 0)
+
+    def _submit(self, item):
+        try:
+            log.info('Starting extractRefresh Job for "%s" ' % item.name)
+            if isinstance(item, WorkbookItem):
+                return self.tableau.refresh_workbook(wb_item=item, attempt=self.retry_attempt,
+                                                     retry_wait=self.retry_wait), None
+            return self.tableau.refresh_extract(ds_item=item, attempt=self.retry_attempt,
+                                                retry_wait=self.retry_wait), None
+        except Exception as e:
+            log.warning(str(e).strip())
+            return None, str(e).strip()
+
+    def discover_dependencies(self, items: list, max_workers=8) -> dict:
+        """
+        find given datasources feeding given workbooks through published datasource (sqlproxy) connections
+
+        :param items: DatasourceItem and WorkbookItem list
+        :param max_workers: number of workbooks scanned concurrently
+        :return: dict of workbook id to names of datasources it depends on
+        """
+        datasource_names = {item.name.lower() for item in items if not isinstance(item, WorkbookItem)}
+        workbooks = [item for item in items if isinstance(item, WorkbookItem)]
+        dependencies = dict()
+        if not datasource_names or not workbooks:
+            return dependencies
+        for wb, connections in self.tableau._scan_connections(self.tableau.server.workbooks, workbooks,
+                                                              max_workers=max_workers):
+            upstream = [conn.datasource_name for conn in connections or list() if conn.connection_type == 'sqlproxy'
+                        and str(conn.datasource_name).lower() in datasource_names]
+            if upstream:
+                log.info("'%s' depends on %s " % (wb.name, str(upstream)))
+                dependencies[wb.id] = upstream
+        return dependencies
+
+    @staticmethod
+    def _node(item) -> tuple:
+        return 'workbook' if isinstance(item, WorkbookItem) else 'datasource', item.id
+
+    @classmethod
+    def _upstreams(cls, items: list, dependencies: dict = None) -> dict:
+        """
+        resolve dependencies to upstream nodes of each item, nodes are (content type, item id) so same named items
+        stay apart. a dependency key is an item id or an item name, an upstream name refers to the datasources with
+        that name, or to the workbooks when no datasource has it
+
+        :param items:
+        :param dependencies: see run
+        :return: dict of node to set of upstream nodes
+        """
+        by_id = dict()
+        by_name = dict()
+        for item in items:
+            by_id.setdefault(item.id, set()).add(cls._node(item))
+            by_name.setdefault(item.name.lower(), set()).add(cls._node(item))
+
+        def _upstream_nodes(name):
+            nodes = by_id.get(name) or by_name.get(str(name).lower(), set())
+            return {node for node in nodes if node[0] == 'datasource'} or nodes
+
+        upstreams = {cls._node(item): set() for item in items}
+        for name, upstream in (dependencies or dict()).items():
+            for node in by_id.get(name) or by_name.get(str(name).lower(), set()):
+                for upstream_name in upstream:
+                    upstreams[node].update(_upstream_nodes(upstream_name) - {node})
+
+        # make sure the dependencies can be resolved
+        resolved = set()
+        while len(resolved) < len(upstreams):
+            ready = [node for node, upstream in upstreams.items() if node not in resolved and upstream <= resolved]
+            if not ready:
+                raise Exception("Refresh dependencies have a cycle between [%s]!" % ','.join(
+                    sorted("%s:%s" % node for node in set(upstreams.keys()) - resolved)))
+            resolved.update(ready)
+        return upstreams
+
+    def run(self, items: list, timeout=None, on_complete=None, dependencies: dict = None) -> tuple:
+        """
+        refresh given items and wait for their refresh jobs. an item having dependencies is submitted as soon as all
+        of its upstream refresh jobs succeed, independent items run in parallel and a failure only blocks the items
+        depending on it
+
+        :param items: DatasourceItem and WorkbookItem list
+        :param timeout: seconds to wait for all refreshes to finish
+        :param on_complete: callback called with (key, job) as soon as a refresh job finishes
+        :param dependencies: dict of item id or name to names of items which must refresh before it, see
+            discover_dependencies and _upstreams. names not in items are ignored
+        :return: dict of key to finished JobItem and dict of item name to submission error
+        """
+        queue = list(items)
+        upstreams = self._upstreams(queue, dependencies)
+        names = {self._node(item): item.name for item in queue}
+        # nodes of finished refreshes
+        succeeded = set()
+        failed = set()
+        in_flight = dict()
+        in_flight_nodes = dict()
+        completed_jobs = dict()
+        failed_submissions = dict()
+        interval = self.job_tracker.min_interval
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            while queue or in_flight:
+                # skip items depending on failed refreshes
+                blocked = [item for item in queue if upstreams[self._node(item)] & failed]
+                while blocked:
+                    for item in blocked:
+                        queue.remove(item)
+                        failed.add(self._node(item))
+                        failed_submissions[item.name] = "upstream %s failed" % ','.join(
+                            sorted(names[node] for node in upstreams[self._node(item)] & failed))
+                        log.error("Skipping extractRefresh of '%s', %s " % (item.name, failed_submissions[item.name]))
+                    blocked = [item for item in queue if upstreams[self._node(item)] & failed]
+
+                ready = [item for item in queue if upstreams[self._node(item)] <= succeeded]
+                slots = self._free_slots(len(in_flight)) if ready else 0
+                submitted = ready[:slots]
+                queue = [item for item in queue if item not in submitted]
+                for item, (job, error) in zip(submitted, executor.map(self._submit, submitted)):
+                    if job is not None:
+                        in_flight[item.name + ':' + job.id] = job
+                        in_flight_nodes[item.name + ':' + job.id] = self._node(item)
+                    elif error is not None:
+                        failed.add(self._node(item))
+                        failed_submissions[item.name] = error
+                    else:
+                        succeeded.add(self._node(item))
+                if not queue and not in_flight:
+                    break
+                if submitted and not in_flight:
+                    continue
+
+                if deadline is not None and deadline - time.monotonic() <= 0:
+                    raise TimeoutError("Following extractRefresh Jobs are not finished in %s seconds \n[%s]!" % (
+                        timeout, ','.join(list(in_flight.keys()) + [item.name for item in queue])))
+                wait, interval = self.job_tracker.next_interval(interval)
+                if deadline is not None:
+                    wait = min(wait, deadline - time.monotonic())
+                time.sleep(max(wait, 0))
+
+                finished_jobs = self.job_tracker.poll(in_flight, executor=executor) if in_flight else dict()
+                for key, job in finished_jobs.items():
+                    in_flight.pop(key)
+                    node = in_flight_nodes.pop(key)
+                    if PyTableauJobTracker.is_succeeded(job):
+                        succeeded.add(node)
+                    else:
+                        failed.add(node)
+                    completed_jobs[key] = job
+                    if on_complete is not None:
+                        on_complete(key, job)
+                if finished_jobs:
+                    # freed slots or unblocked items, check again soon
+                    interval = self.job_tracker.min_interval
+        return completed_jobs, failed_submissions
+
+
+class AsyncPyTableau():
+    """
+    asyncio counterpart of PyTableau. operations run as coroutines on a thread pool and share the pooled http session
+    of the wrapped PyTableau, at most max_concurrency operations of the site are in flight at the same time
+    """
+
+    def __init__(self, tableau: PyTableau, max_concurrency=10):
+        self.tableau = tableau
+        self.max_concurrency = max_concurrency
+        self.tableau.set_http_pool_size(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency)
+        # created on first use, asyncio primitives must be created inside the running event loop
+        self._semaphore = None
+
+    @classmethod
+    async def create(cls, server_address, username, password, site_id, max_concurrency=10, **kwargs):
+        """
+        sign in without blocking the event loop
+
+        :return: AsyncPyTableau
+        """
+        tableau = await asyncio.get_running_loop().run_in_executor(
+            None, functools.partial(PyTableau, server_address, username, password, site_id, **kwargs))
+        return cls(tableau=tableau, max_concurrency=max_concurrency)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        await asyncio.get_running_loop().run_in_executor(None, self.tableau.sign_out)
+        self._executor.shutdown(wait=False)
+
+    async def _run(self, func, *args, **kwargs):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            return await asyncio.get_running_loop().run_in_executor(self._executor,
+                                                                    functools.partial(func, *args, **kwargs))
+
+    async def download_all_datasources(self, download_dir, **kwargs):
+        """ see PyTableau.download_all_datasources """
+        return await self._run(self.tableau.download_all_datasources, download_dir, **kwargs)
+
+    async def download_all_workbooks(self, download_dir, **kwargs):
+        """ see PyTableau.download_all_workbooks """
+        return await self._run(self.tableau.download_all_workbooks, download_dir, **kwargs)
+
+    async def get_all_workbook_fields(self, workbooks_dir, **kwargs):
+        """ see PyTableau.get_all_workbook_fields """
+        return await self._run(self.tableau.get_all_workbook_fields, workbooks_dir, **kwargs)
+
+    async def get_all_datasource_fields(self, datasource_dir, **kwargs):
+        """ see PyTableau.get_all_datasource_fields """
+        return await self._run(self.tableau.get_all_datasource_fields, datasource_dir, **kwargs)
+
+    async def export_all_workbook_fields_to_csv(self, workbooks_dir, **kwargs):
+        """ see PyTableau.export_all_workbook_fields_to_csv """
+        return await self._run(self.tableau.export_all_workbook_fields_to_csv, workbooks_dir, **kwargs)
+
+    async def export_all_datasource_fields_to_csv(self, datasource_dir, **kwargs):
+        """ see PyTableau.export_all_datasource_fields_to_csv """
+        return await self._run(self.tableau.export_all_datasource_fields_to_csv, datasource_dir, **kwargs)
+
+    async def refresh_extracts(self, datasource_names, **kwargs):
+        """ see PyTableau.refresh_extracts """
+        return await self._run(self.tableau.refresh_extracts, datasource_names, **kwargs)
+
+    async def refresh_extract(self, ds_item, **kwargs):
+        """ see PyTableau.refresh_extract """
+        return await self._run(self.tableau.refresh_extract, ds_item, **kwargs)
+
+    async def refresh_workbook(self, wb_item, **kwargs):
+        """ see PyTableau.refresh_workbook """
+        return await self._run(self.tableau.refresh_workbook, wb_item, **kwargs)
+
+    async def get_workbook_views(self, workbook_id):
+        """ see PyTableau.get_workbook_views """
+        return await self._run(self.tableau.get_workbook_views, workbook_id)
+
+    async def download_workbook_pdf(self, workbook: WorkbookItem, dest_dir, **kwargs):
+        """ see PyTableau.download_workbook_pdf """
+        return await self._run(self.tableau.download_workbook_pdf, workbook, dest_dir, **kwargs)
+
+    async def download_workbook_png(self, workbook: WorkbookItem, dest_dir, **kwargs):
+        """ see PyTableau.download_workbook_png """
+        return await self._run(self.tableau.download_workbook_png, workbook, dest_dir, **kwargs)
+
+    async def download_workbook_csv(self, workbook: WorkbookItem, dest_dir, **kwargs):
+        """ see PyTableau.download_workbook_csv """
+        return await self._run(self.tableau.download_workbook_csv, workbook, dest_dir, **kwargs)
+
+    async def download_workbook(self, file_type: str, workbook: WorkbookItem, dest_dir, **kwargs):
+        """ see PyTableau.download_workbook """
+        return await self._run(self.tableau.download_workbook, file_type, workbook, dest_dir, **kwargs)
+
+    async def get_workbook_by_name(self, name, **kwargs):
+        """ see PyTableau.get_workbook_by_name """
+        return await self._run(self.tableau.get_workbook_by_name, name, **kwargs)
+
+    async def get_workbooks_by_tag(self, tag, **kwargs):
+        """ see PyTableau.get_workbooks_by_tag """
+        return await self._run(self.tableau.get_workbooks_by_tag, tag, **kwargs)
+
+    async def get_datasource_by_name(self, name, **kwargs):
+        """ see PyTableau.get_datasource_by_name """
+        return await self._run(self.tableau.get_datasource_by_name, name, **kwargs)
+
+    async def get_project_by_name(self, name, **kwargs):
+        """ see PyTableau.get_project_by_name """
+        return await self._run(self.tableau.get_project_by_name, name, **kwargs)
+
+    async def update_all_datasource_connections(self, curr_server_address, curr_username, **kwargs):
+        """ see PyTableau.update_all_datasource_connections """
+        return await self._run(self.tableau.update_all_datasource_connections, curr_server_address, curr_username,
+                               **kwargs)
+
+    async def update_all_workbook_connections(self, curr_server_address, curr_username, **kwargs):
+        """ see PyTableau.update_all_workbook_connections """
+        return await self._run(self.tableau.update_all_workbook_connections, curr_server_address, curr_username,
+                               **kwargs)
+
+
+class PyTableauMailer():
+    """
+    send emails in background threads through a pool of pool_size smtp connections, one per thread. connections are
+    created with smtp_factory and created again when they drop, the failed send is retried on the new connection.
+    sends are limited to rate emails per second for the relay
+    """
+    RECONNECT_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, socket.timeout)
+
+    def __init__(self, smtp_factory, pool_size=2, rate=None, retry_attempt=3, retry_wait=5):
+        """
+
+        :param smtp_factory: callable returning a connected and logged in smtplib.SMTP
+        :param pool_size: number of connections and sending threads
+        :param rate: maximum number of emails sent per second
+        :param retry_attempt: number of send attempts per email
+        :param retry_wait: seconds to wait before sending again on a new connection
+        """
+        self.smtp_factory = smtp_factory
+        self.retry_attempt = retry_attempt
+        self.retry_wait = retry_wait
+        self.rate_limiter = PyTableauRateLimiter(rate=rate)
+        self._executor = ThreadPoolExecutor(max_workers=max(pool_size, 1))
+        self._local = threading.local()
+        self._connections = list()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def ssl(cls, host, port=465, username=None, password=None, timeout=60, **kwargs):
+        """
+        mailer connecting with smtplib.SMTP_SSL
+
+        :param host:
+        :param port:
+        :param username: login when given
+        :param password:
+        :param timeout: socket timeout of the connections
+        :param kwargs: see PyTableauMailer
+        :return: PyTableauMailer
+        """
+
+        def smtp_factory():
+            smtp = smtplib.SMTP_SSL(host=host, port=port, timeout=timeout)
+            if username:
+                smtp.login(username, password)
+            return smtp
+
+        return cls(smtp_factory, **kwargs)
+
+    def _connection(self):
+        smtp = getattr(self._local, 'smtp', None)
+        if smtp is None:
+            smtp = self.smtp_factory()
+            self._local.smtp = smtp
+            with self._lock:
+                self._connections.append(smtp)
+        return smtp
+
+    def _drop_connection(self):
+        smtp = getattr(self._local, 'smtp', None)
+        self._local.smtp = None
+        if smtp is None:
+            return
+        with self._lock:
+            if smtp in self._connections:
+                self._connections.remove(smtp)
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+    def _send(self, msg, from_addr=None, to_addrs=None):
+        current_attempt = 1
+        while True:
+            try:
+                smtp = self._connection()
+                self.rate_limiter.wait()
+                # envelope sender defaults to the logged in user
+                with metrics.timer('email'):
+                    return smtp.send_message(msg, from_addr=from_addr or getattr(smtp, 'user', None) or None,
+                                             to_addrs=to_addrs)
+            except self.RECONNECT_ERRORS as e:
+                self._drop_connection()
+                if current_attempt >= self.retry_attempt:
+                    raise e
+                current_attempt = current_attempt + 1
+                log.warning("Smtp connection failed %s, Trying %s th time" % (str(e).strip(), current_attempt))
+                time.sleep(self.retry_wait)
+
+    def submit(self, msg, from_addr=None, to_addrs=None):
+        """
+        queue the email and return right away
+
+        :param msg: email.message.Message
+        :param from_addr: envelope sender, the logged in user when None
+        :param to_addrs: envelope recipients, the message recipients when None
+        :return: concurrent.futures.Future of the send
+        """
+        return self._executor.submit(self._send, msg, from_addr, to_addrs)
+
+    def send(self, msg, from_addr=None, to_addrs=None):
+        """
+        send the email and wait for it, see submit
+        """
+        return self.submit(msg, from_addr=from_addr, to_addrs=to_addrs).result()
+
+    def close(self):
+        """
+        wait for queued emails and close the connections
+        """
+        self._executor.shutdown(wait=True)
+        with self._lock:
+            connections, self._connections = self._connections, list()
+        for smtp in connections:
+            try:
+                smtp.quit()
+            except Exception:
+                pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class PyTableauSmtpStub():
+    """
+    in memory stand in for smtplib.SMTP recording sent emails, for tests. with fail_after the connection drops after
+    given number of emails
+    """
+
+    def __init__(self, user=None, fail_after=None, outbox: list = None):
+        """
+
+        :param user: logged in user
+        :param fail_after: number of emails sent before the connection drops
+        :param outbox: list the sent emails are appended to, can be shared by multiple stub connections
+        """
+        self.user = user
+        self.fail_after = fail_after
+        self.outbox = outbox if outbox is not None else list()
+        self.closed = False
+        self._sent = 0
+
+    def ehlo(self, name=''):
+        return 250, b'stub'
+
+    def helo(self, name=''):
+        return 250, b'stub'
+
+    def noop(self):
+        return 250, b'OK'
+
+    def send_message(self, msg, from_addr=None, to_addrs=None, **kwargs):
+        if self.closed or (self.fail_after is not None and self._sent >= self.fail_after):
+            self.closed = True
+            raise smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+        self._sent += 1
+        self.outbox.append({'from_addr': from_addr or msg['From'], 'to_addrs': to_addrs, 'msg': msg})
+        return dict()
+
+    def close(self):
+        self.closed = True
+
+    def quit(self):
+        self.closed = True
+        return 221, b'Bye'
 
 
 class PyTableauReportScheduler():
@@ -696,69 +3158,183 @@ class PyTableauReportScheduler():
     """
 
     def __init__(self, tableau: PyTableau, smtp_server: smtplib.SMTP_SSL, schedule_tag, dailySchedulePrefix="Daily",
-                 weeklySchedulePrefix="Weekly", monthlySchedulePrefix="Monthly"):
+                 weeklySchedulePrefix="Weekly", monthlySchedulePrefix="Monthly", mailer: PyTableauMailer = None):
+        """
+
+        :param smtp_server: connection used when mailer is not given, it is not reconnected when it drops
+        :param mailer: PyTableauMailer sending the emails in background while next workbooks are exported. a given
+            mailer is not closed by the scheduler, it can be shared
+        """
         self.tableau = tableau
         self.schedule_tag = schedule_tag
         self.dailySchedules = "%s" % dailySchedulePrefix
         self.weeklySchedules = "%s%s" % (weeklySchedulePrefix, str(datetime.now().isoweekday()))
         self.monthlySchedules = "%s%s" % (monthlySchedulePrefix, str(datetime.now().day))
         self.smtp_server: smtplib.SMTP_SSL = smtp_server
+        # only the mailer created here is closed by close
+        self._owns_mailer = mailer is None
+        self.mailer = mailer or PyTableauMailer(lambda: smtp_server, pool_size=1, retry_attempt=1)
+        # exported workbook files of the running report run, keyed by export parameters
+        self._render_cache = None
+        self._render_dir = None
+
+        if self.smtp_server is not None:
+            try:
+                log.debug(self.smtp_server.ehlo())
+                log.info(self.smtp_server.helo())
+            except Exception as e:
+                log.error(e)
+                raise e
 
-        try:
-            log.debug(self.smtp_server.ehlo())
-            log.info(self.smtp_server.helo())
-        except Exception as e:
-            log.error(e)
-            raise e
+    def close(self):
+        """
+        wait for queued emails and close the mailer created for smtp_server
+        """
+        if getattr(self, '_owns_mailer', False):
+            self.mailer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
 
     def __del__(self):
         try:
-            self.smtp_server.quit()
+            self.close()
         except:
             pass
 
+    @contextmanager
+    def _report_run(self):
+        """
+        within a report run each unique workbook export is rendered once and reused by every email sending it
+        """
+        if self._render_cache is not None:
+            yield
+            return
+        with tempfile.TemporaryDirectory() as render_dir:
+            self._render_dir = render_dir
+            self._render_cache = dict()
+            try:
+                yield
+            finally:
+                self._render_cache = None
+                self._render_dir = None
+
+    def _render_workbook(self, wb: WorkbookItem, file_type, dest_dir, data_filters: dict = None, page_type=None,
+                         orientation=None) -> str:
+        """
+        export workbook to dest_dir, inside a report run already exported workbook file is reused
+
+        :param wb:
+        :param file_type:
+        :param dest_dir:
+        :param data_filters:
+        :param page_type:
+        :param orientation:
+        :return: exported workbook file
+        """
+        if self._render_cache is None:
+            return self.tableau.download_workbook(file_type=file_type, workbook=wb, dest_dir=dest_dir,
+                                                  data_filters=data_filters, page_type=page_type,
+                                                  orientation=orientation)
+
+        key = (wb.id, file_type.lower(), tuple(sorted((data_filters or dict()).items())), page_type, orientation)
+        if key in self._render_cache:
+            log.info("Reusing exported Workbook '%s' %s" % (wb.name, self._render_cache[key]))
+        else:
+            self._render_cache[key] = self.tableau.download_workbook(file_type=file_type, workbook=wb,
+                                                                     dest_dir=tempfile.mkdtemp(dir=self._render_dir),
+                                                                     data_filters=data_filters,
+                                                                     page_type=page_type, orientation=orientation)
+        return self._render_cache[key]
+
     def get_scheduled_workbooks(self) -> [WorkbookItem]:
-        return self.tableau.get_workbooks_by_tag(tag=self.schedule_tag)
+        with metrics.timer('list'):
+            return self.tableau.get_workbooks_by_tag(tag=self.schedule_tag)
 
-    def _get_email_params(self, wb: WorkbookItem, schedule):
+    @staticmethod
+    def _parse_schedule_tags(wb: WorkbookItem) -> dict:
         """
+        parse '<schedule>:to:<email>' and '<schedule>:cc:<email>' tags of the workbook
 
         :param wb:
-        :param schedule:
-        :return:
+        :return: dict of schedule to {'to': [emails], 'cc': [emails]}
         """
-        email_to = list()
-        email_cc = list()
-        email_subject = wb.name
-        _to_prefix = schedule + ':to:'
-        _cc_prefix = schedule + ':cc:'
+        recipients = dict()
         tag: str
         for tag in wb.tags:
-            if tag.startswith(_to_prefix) and '@' in tag:
-                email_to.append(tag.replace(_to_prefix, ''))
-            if tag.startswith(_cc_prefix) and '@' in tag:
-                email_cc.append(tag.replace(_cc_prefix, ''))
+            _schedule, _, _recipient = tag.partition(':')
+            _kind, _, _email = _recipient.partition(':')
+            if _kind in ('to', 'cc') and '@' in _email:
+                recipients.setdefault(_schedule, {'to': list(), 'cc': list()})[_kind].append(_email)
+        return recipients
 
-        return email_subject, email_to, email_cc
+    def _get_email_params(self, wb: WorkbookItem, schedule):
+        """
 
-    def _send_reports(self, send_from, schedule=None, email_subject=None, email_message=None,
-                      data_filters: dict = None):
+        :param wb:
+        :param schedule:
+        :return:
+        """
+        recipients = self._parse_schedule_tags(wb).get(schedule.strip(':'), {'to': list(), 'cc': list()})
+        return wb.name, recipients['to'], recipients['cc']
 
-        log.info('Sending Reports With tag: %s:to:user@email.com ' % schedule)
+    def _plan_reports(self, schedules: list, email_subject=None, email_message=None) -> list:
+        """
+        list scheduled workbooks once and plan the emails of all given schedules
 
+        :param schedules:
+        :param email_subject:
+        :param email_message:
+        :return: list of dicts with wb, schedule, subj, message, to and cc keys
+        """
+        schedules = [schedule.strip(':') for schedule in schedules]
+        plan = list()
         for wb in self.get_scheduled_workbooks():
-            subj, to, cc = self._get_email_params(wb, schedule)
-            if email_subject:
-                subj = email_subject
+            recipients = self._parse_schedule_tags(wb)
+            for schedule in schedules:
+                if schedule in recipients and recipients[schedule]['to']:
+                    plan.append({'wb': wb,
+                                 'schedule': schedule,
+                                 'subj': email_subject or wb.name,
+                                 'message': email_message or "Attached Report %s" % wb.name,
+                                 'to': recipients[schedule]['to'],
+                                 'cc': recipients[schedule]['cc']})
+        log.info("Planned %s Reports for schedules: %s" % (len(plan), COMMASPACE.join(schedules)))
+        return plan
+
+    def _dispatch_reports(self, plan: list, send_from, data_filters: dict = None):
+        """
+        send planned reports
+
+        :param plan: see _plan_reports
+        :param send_from:
+        :param data_filters:
+        """
+        sends = list()
+        with self._report_run():
+            for report in plan:
+                log.info("Sending Workbook '%s' schedule: %s to: %s cc: %s" % (
+                    report['wb'].name, report['schedule'], COMMASPACE.join(report['to']),
+                    COMMASPACE.join(report['cc'])))
+                # emails are sent in background while the next workbook is exported
+                sends.append(self._email(report['wb'], send_from=send_from, subj=report['subj'],
+                                         message=report['message'], to=report['to'], cc=report['cc'],
+                                         data_filters=data_filters, file_type='pdf', wait=False))
+            futures_wait(sends)
+
+        failed = [report['subj'] for report, send in zip(plan, sends) if send.exception() is not None]
+        if failed:
+            raise Exception("Following Reports are not sent \n[%s]!" % ','.join(failed))
 
-            message = "Attached Report %s" % wb.name
-            if email_message:
-                message = email_message
+    def _send_reports(self, send_from, schedule=None, email_subject=None, email_message=None,
+                      data_filters: dict = None):
 
-            if to:
-                log.info("Sending Workbook '%s' to: %s cc: %s" % (wb.name, COMMASPACE.join(to), COMMASPACE.join(cc)))
-                self._email(wb, send_from=send_from, subj=subj, message=message, to=to, cc=cc,
-                            data_filters=data_filters, file_type='pdf')
+        log.info('Sending Reports With tag: %s:to:user@email.com ' % schedule)
+        plan = self._plan_reports(schedules=[schedule], email_subject=email_subject, email_message=email_message)
+        self._dispatch_reports(plan, send_from=send_from, data_filters=data_filters)
 
     def send_scheduled_reports(self, send_from, email_subject=None, email_message=None, data_filters: dict = None):
         """
@@ -768,12 +3344,9 @@ class PyTableauReportScheduler():
         :param email_message:
         """
         # self.smtp_server.connect()
-        self._send_reports(send_from=send_from, schedule=self.dailySchedules, email_subject=email_subject,
-                           email_message=email_message, data_filters=data_filters)
-        self._send_reports(send_from=send_from, schedule=self.weeklySchedules, email_subject=email_subject,
-                           email_message=email_message, data_filters=data_filters)
-        self._send_reports(send_from=send_from, schedule=self.monthlySchedules, email_subject=email_subject,
-                           email_message=email_message, data_filters=data_filters)
+        plan = self._plan_reports(schedules=[self.dailySchedules, self.weeklySchedules, self.monthlySchedules],
+                                  email_subject=email_subject, email_message=email_message)
+        self._dispatch_reports(plan, send_from=send_from, data_filters=data_filters)
 
     def send_schedule(self, send_from, schedule: str, email_subject=None, email_message=None,
                       data_filters: dict = None):
@@ -785,7 +3358,7 @@ class PyTableauReportScheduler():
         :param email_message:
         """
         # self.smtp_server.connect()
-        schedule = "%s:" % schedule.strip(':')
+        schedule = schedule.strip(':')
         self._send_reports(send_from=send_from, schedule=schedule, email_subject=email_subject,
                            email_message=email_message, data_filters=data_filters)
 
@@ -808,9 +3381,10 @@ class PyTableauReportScheduler():
                            data_filters=data_filters, page_type=page_type, orientation=orientation)
 
     def _email(self, wb, file_type, send_from: str, to: list, cc: list = None, subj: str = None, message: str = None,
-               data_filters: dict = None, page_type=None, orientation=None):
+               data_filters: dict = None, page_type=None, orientation=None, wait=True):
         """
 
+        :param wait: wait for the email to be sent, otherwise return the Future of the send
         :param data_filters:
         :param wb:
         :param send_from:
@@ -839,13 +3413,13 @@ class PyTableauReportScheduler():
 
             msg.attach(MIMEText(message))
 
-            wb_file = self.tableau.download_workbook(file_type=file_type,
-                                                     workbook=wb,
-                                                     dest_dir=tmpdirname,
-                                                     data_filters=data_filters,
-                                                     page_type=page_type,
-                                                     orientation=orientation
-                                                     )
+            wb_file = self._render_workbook(wb=wb,
+                                            file_type=file_type,
+                                            dest_dir=tmpdirname,
+                                            data_filters=data_filters,
+                                            page_type=page_type,
+                                            orientation=orientation
+                                            )
             with open(wb_file, "rb") as myfile:
                 part = MIMEApplication(
                     myfile.read(),
@@ -855,5 +3429,13 @@ class PyTableauReportScheduler():
             part['Content-Disposition'] = 'attachment; filename="%s"' % basename(wb_file)
 
             msg.attach(part)
-            self.smtp_server.send_message(from_addr=self.smtp_server.user, to_addrs=_m_to, msg=msg)
-            log.info("Sent Email subj:'%s' to: %s cc: %s" % (subj, COMMASPACE.join(_m_to), COMMASPACE.join(cc)))
+
+        def _log_send(send):
+            if send.exception() is None:
+                log.info("Sent Email subj:'%s' to: %s cc: %s" % (subj, COMMASPACE.join(_m_to), COMMASPACE.join(cc)))
+            else:
+                log.error("Sending Email subj:'%s' failed %s" % (subj, str(send.exception()).strip()))
+
+        send = self.mailer.submit(msg, to_addrs=_m_to)
+        send.add_done_callback(_log_send)
+        return send.result() if wait else send
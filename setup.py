@@ -8,14 +8,21 @@ os.chdir(setup_py_dir)
 setup(
     name='pytableau',
     version='1.0.1',
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks', 'benchmarks.*']),
     author='Memiiso',
     description='Python Tableau Wrapper',
     url='https://github.com/memiiso/pytableau',
     download_url='https://github.com/memiiso/pytableau/archive/master.zip',
     include_package_data=True,
     test_suite='tests',
-    install_requires=['pandas>=1.0.1', 'tableaudocumentapi>=0.7', 'tableauserverclient>=0.16.0', 'PyPDF3==1.0.5',
-                      'Pillow==9.3.0', "openpyxl==3.0.4"],
+    install_requires=['tableauserverclient>=0.16.0'],
+    # heavy dependencies are imported on first use, refresh and lookup only installs need none of them
+    extras_require={'pdf': ['PyPDF3==1.0.5'],
+                    'png': ['Pillow==9.3.0'],
+                    'xlsx': ["openpyxl==3.0.4"],
+                    'parquet': ['pyarrow'],
+                    'fields': ['pandas>=1.0.1', 'tableaudocumentapi>=0.7'],
+                    'all': ['PyPDF3==1.0.5', 'Pillow==9.3.0', "openpyxl==3.0.4", 'pyarrow', 'pandas>=1.0.1',
+                            'tableaudocumentapi>=0.7']},
     python_requires='>=3.7',
 )
@@ -1,7 +1,875 @@
-from unittest import TestCase
+import asyncio
+import gzip
+import io
+import os
+import re
+import tempfile
+import threading
+import time
+import zipfile
+from datetime import datetime, timedelta
+from email.mime.text import MIMEText
+from types import SimpleNamespace
+from unittest import TestCase, mock
+
+import PyPDF3
+import pyarrow.parquet
+import requests
+import tableauserverclient as TSC
+from PIL import Image
+from openpyxl import load_workbook
+
+from pytableau import PyTableau, PyTableauReportScheduler, PyTableauJobTracker, AsyncPyTableau, PyTableauUtils, \
+    PyTableauPdfWriter, PyTableauConnectionIndex, PyTableauRefreshScheduler, \
+    PyTableauMailer, PyTableauSmtpStub, PyTableauMetrics, PyTableauConnectionMigration, \
+    PyTableauThreadSessions
+
+SAMPLE_WORKBOOK = """<?xml version='1.0' encoding='utf-8' ?>
+<workbook source-build='2020.1' version='18.1' xmlns:user='http://www.tableausoftware.com/xml/user'>
+  <datasources>
+    <datasource caption='Sales' inline='true' name='sales.1' version='18.1'>
+      <connection class='federated'>
+        <named-connections>
+          <named-connection caption='db' name='pg.1'>
+            <connection class='postgres' dbname='db' server='db-host' username='user' port='5432' />
+          </named-connection>
+        </named-connections>
+      </connection>
+      <column datatype='real' name='[Amount]' role='measure' type='quantitative' />
+      <column caption='Region Name' datatype='string' name='[Region]' role='dimension' type='nominal' />
+    </datasource>
+  </datasources>
+  <worksheets>
+    <worksheet name='Sheet 1'>
+      <table>
+        <view>
+          <datasources>
+            <datasource caption='Sales' name='sales.1' />
+          </datasources>
+          <datasource-dependencies datasource='sales.1'>
+            <column datatype='real' name='[Amount]' role='measure' type='quantitative' />
+          </datasource-dependencies>
+        </view>
+      </table>
+    </worksheet>
+  </worksheets>
+</workbook>
+"""
 
 
 class TestPyTableau(TestCase):
 
     def test_empty(self):
         pass
+
+    def test_download_views_keeps_view_order(self):
+        tableau = PyTableau.__new__(PyTableau)
+        views = [SimpleNamespace(id=str(i), name="view%s" % i) for i in range(5)]
+
+        def download_view(view, dest_dir, view_filters):
+            # later views finish first
+            time.sleep(0.01 * (5 - int(view.id)))
+            return view.id
+
+        self.assertEqual(tableau._download_views(views, download_view, dest_dir=None, view_filters=None,
+                                                 max_workers=5), ['0', '1', '2', '3', '4'])
+
+    def test_download_views_timeout(self):
+        class SlowAdapter(requests.adapters.BaseAdapter):
+            def __init__(self):
+                super().__init__()
+                self.timeouts = list()
+
+            def send(self, request, timeout=None, **kwargs):
+                self.timeouts.append(timeout)
+                if request.url.endswith('/0'):
+                    raise requests.exceptions.ReadTimeout("read timed out")
+                time.sleep(0.05)
+                response = requests.Response()
+                response.status_code, response._content, response.request = 200, b'', request
+                return response
+
+            def close(self):
+                pass
+
+        adapter = SlowAdapter()
+        session = requests.Session()
+        session.mount('http://', adapter)
+        tableau = PyTableau.__new__(PyTableau)
+        tableau.server = SimpleNamespace(_session=PyTableauThreadSessions(session))
+        views = [SimpleNamespace(id=str(i), name="view%s" % i) for i in range(4)]
+        finished = list()
+
+        def download_view(view, dest_dir, view_filters):
+            tableau.server._session.get('http://tableau/views/%s' % view.id)
+            finished.append(view.id)
+
+        for max_workers in (1, 2):
+            with self.assertRaises(TimeoutError):
+                tableau._download_views(views, download_view, dest_dir=None, view_filters=None,
+                                        max_workers=max_workers, timeout=0.01)
+        # the timeout is applied to the requests, running exports finish before returning
+        self.assertTrue(adapter.timeouts and all(timeout == 0.01 for timeout in adapter.timeouts))
+        self.assertEqual(len(finished), len(adapter.timeouts) - 2)
+        # requests without export timeout do not get one
+        tableau.server._session.get('http://tableau/views/1')
+        self.assertIsNone(adapter.timeouts[-1])
+
+    def test_download_all_summary(self):
+        class FakeEndpoint:
+            attempts = dict()
+
+            def get(self, req_options=None):
+                items = [SimpleNamespace(id=str(i), name="item%s" % i, project_name="project") for i in range(4)]
+                return items, SimpleNamespace(page_number=1, page_size=100, total_available=4)
+
+            def download(self, item_id, filepath, include_extract=False):
+                self.attempts[item_id] = self.attempts.get(item_id, 0) + 1
+                if item_id == '3' or (item_id == '2' and self.attempts[item_id] == 1):
+                    raise Exception("download failed")
+                return os.path.join(filepath, item_id)
+
+        tableau = PyTableau.__new__(PyTableau)
+        with tempfile.TemporaryDirectory() as download_dir, \
+                mock.patch('pytableau.time.sleep'):
+            summary = tableau._download_all(FakeEndpoint(), item_type='workbook', download_dir=download_dir,
+                                            max_workers=3, retry_attempt=2, include_extract=False)
+            self.assertEqual(sorted(os.path.basename(path) for path in summary['downloaded']), ['0', '1', '2'])
+            self.assertEqual(list(summary['failed'].keys()), ['project/item3'])
+
+    def test_download_all_incremental(self):
+        class FakeEndpoint:
+            def __init__(self):
+                self.items = {str(i): "2020-01-01" for i in range(3)}
+                self.downloads = list()
+
+            def get(self, req_options=None):
+                items = [SimpleNamespace(id=item_id, name="item%s" % item_id, project_name="project",
+                                         updated_at=updated_at) for item_id, updated_at in self.items.items()]
+                return items, SimpleNamespace(page_number=1, page_size=100, total_available=len(items))
+
+            def download(self, item_id, filepath, include_extract=False):
+                self.downloads.append(item_id)
+                path = os.path.join(filepath, "%s.twbx" % item_id)
+                with open(path, 'w') as f:
+                    f.write(self.items[item_id])
+                return path
+
+        tableau = PyTableau.__new__(PyTableau)
+        endpoint = FakeEndpoint()
+        with tempfile.TemporaryDirectory() as download_dir:
+            tableau._download_all(endpoint, item_type='workbook', download_dir=download_dir, incremental=True)
+            self.assertEqual(sorted(endpoint.downloads), ['0', '1', '2'])
+
+            endpoint.downloads.clear()
+            endpoint.items['1'] = "2020-02-01"
+            endpoint.items.pop('2')
+            summary = tableau._download_all(endpoint, item_type='workbook', download_dir=download_dir,
+                                            incremental=True)
+            self.assertEqual(endpoint.downloads, ['1'])
+            self.assertEqual(len(summary['unchanged']), 1)
+            self.assertEqual(len(summary['deleted']), 1)
+            self.assertEqual(sorted(os.listdir(os.path.join(download_dir, 'project'))), ['0.twbx', '1.twbx'])
+
+            # unchanged files are not hashed, a touched file is hashed once
+            os.utime(os.path.join(download_dir, 'project', '0.twbx'), (0, 0))
+            with mock.patch.object(PyTableauUtils, 'file_sha256', wraps=PyTableauUtils.file_sha256) as file_sha256:
+                for _ in range(2):
+                    summary = tableau._download_all(endpoint, item_type='workbook', download_dir=download_dir,
+                                                    incremental=True)
+                    self.assertEqual(len(summary['unchanged']), 2)
+            self.assertEqual(file_sha256.call_count, 1)
+
+    def test_img_concat_v_files(self):
+        tableau = PyTableau.__new__(PyTableau)
+        with tempfile.TemporaryDirectory() as dest_dir:
+            img_files = [os.path.join(dest_dir, "%s.png" % i) for i in range(2)]
+            Image.new('RGB', (200, 100), color='red').save(img_files[0])
+            Image.new('RGB', (100, 100), color='blue').save(img_files[1])
+            self.assertEqual(tableau._img_concat_v_files(img_files).size, (100, 150))
+            self.assertEqual(tableau._img_concat_v_files(img_files, max_pixels=3750).size, (50, 75))
+
+    def test_get_all_workbook_fields_in_processes(self):
+        tableau = PyTableau.__new__(PyTableau)
+        with tempfile.TemporaryDirectory() as workbooks_dir:
+            for i in range(3):
+                with open(os.path.join(workbooks_dir, "sample%s.twb" % i), 'w') as f:
+                    f.write(SAMPLE_WORKBOOK)
+            df_fields = tableau.get_all_workbook_fields(workbooks_dir)
+            self.assertEqual(len(df_fields), 6)
+            self.assertEqual(sorted(set(df_fields['worksheet_name'])), ['', 'Sheet 1'])
+            self.assertTrue(df_fields.equals(tableau.get_all_workbook_fields(workbooks_dir, processes=2)))
+
+    def test_get_all_workbook_fields_from_cache(self):
+        tableau = PyTableau.__new__(PyTableau)
+        with tempfile.TemporaryDirectory() as workbooks_dir, tempfile.TemporaryDirectory() as cache_dir:
+            cache_file = os.path.join(cache_dir, 'fields.sqlite')
+            for i in range(2):
+                with open(os.path.join(workbooks_dir, "sample%s.twb" % i), 'w') as f:
+                    f.write(SAMPLE_WORKBOOK)
+            df_fields = tableau.get_all_workbook_fields(workbooks_dir, cache_file=cache_file)
+            self.assertEqual(len(df_fields), 4)
+
+            os.remove(os.path.join(workbooks_dir, "sample1.twb"))
+            with mock.patch.object(PyTableau, '_workbook_field_rows') as workbook_field_rows:
+                df_cached_fields = tableau.get_all_workbook_fields(workbooks_dir, cache_file=cache_file)
+                workbook_field_rows.assert_not_called()
+            self.assertTrue(df_cached_fields.equals(df_fields[df_fields['workbook_name'] == 'sample0.twb']))
+
+            # unreadable workbooks are not cached, they are read again on the next run
+            broken_file = os.path.join(workbooks_dir, "broken.twb")
+            with open(broken_file, 'w') as f:
+                f.write("<workbook")
+            for _ in range(2):
+                with mock.patch.object(PyTableau, '_workbook_field_rows',
+                                       wraps=PyTableau._workbook_field_rows) as workbook_field_rows:
+                    self.assertEqual(len(tableau.get_all_workbook_fields(workbooks_dir, cache_file=cache_file)), 2)
+                self.assertEqual([call.args[0] for call in workbook_field_rows.call_args_list], [broken_file])
+
+    def test_write_workbook_fields_like_to_csv(self):
+        tableau = PyTableau.__new__(PyTableau)
+        with tempfile.TemporaryDirectory() as workbooks_dir:
+            with open(os.path.join(workbooks_dir, "sample.twb"), 'w') as f:
+                f.write(SAMPLE_WORKBOOK)
+            pandas_file = os.path.join(workbooks_dir, "pandas_fields.csv")
+            tableau.get_all_workbook_fields(workbooks_dir).to_csv(pandas_file, sep='\t', encoding='utf-8')
+            field_list_file = os.path.join(workbooks_dir, "all_workbook_fields.csv")
+            self.assertEqual(PyTableauUtils.write_rows(field_list_file, tableau.iter_workbook_fields(workbooks_dir)), 2)
+            with open(pandas_file) as expected, open(field_list_file) as actual:
+                self.assertEqual(actual.read(), expected.read())
+
+    def test_iter_workbook_fields_from_metadata(self):
+        pages = [{'data': {'workbooksConnection': {
+            'nodes': [{'name': 'wb1', 'embeddedDatasources': [{'name': 'Sales', 'fields': [
+                {'__typename': 'ColumnField', 'name': 'Amount', 'dataType': 'REAL', 'role': 'MEASURE',
+                 'downstreamSheets': [{'name': 'Sheet 1'}, {'name': 'Sheet 2'}]}]}]}],
+            'pageInfo': {'hasNextPage': True, 'endCursor': 'cursor1'}}}},
+            {'data': {'workbooksConnection': {
+                'nodes': [{'name': 'wb2', 'embeddedDatasources': [{'name': 'Sales', 'fields': [
+                    {'__typename': 'CalculatedField', 'name': 'Ratio', 'formula': '[A]/[B]',
+                     'downstreamSheets': []},
+                    {'__typename': 'DatasourceField', 'name': 'Region', 'downstreamSheets': [],
+                     'remoteField': {'__typename': 'ColumnField', 'dataType': 'STRING', 'role': 'DIMENSION',
+                                     'aggregation': 'Count'}}]}]}],
+                'pageInfo': {'hasNextPage': False, 'endCursor': None}}}}]
+        after_tokens = list()
+
+        def query(query, variables):
+            after_tokens.append(variables['afterToken'])
+            return pages[len(after_tokens) - 1]
+
+        tableau = PyTableau.__new__(PyTableau)
+        tableau.server = SimpleNamespace(metadata=SimpleNamespace(query=query))
+        rows = list(tableau.iter_workbook_fields_from_metadata())
+        self.assertEqual(after_tokens, [None, 'cursor1'])
+        self.assertEqual([(row['workbook_name'], row['field_name'], row['worksheet_name'], row['field_calculation'])
+                          for row in rows],
+                         [('wb1', 'Amount', 'Sheet 1', ''), ('wb1', 'Amount', 'Sheet 2', ''),
+                          ('wb2', 'Ratio', '', '[A]/[B]'), ('wb2', 'Region', '', '')])
+        self.assertEqual([(row['field_datatype'], row['field_role'], row['field_aggregation']) for row in rows],
+                         [('real', 'measure', ''), ('real', 'measure', ''), ('', '', ''),
+                          ('string', 'dimension', 'Count')])
+        with tempfile.TemporaryDirectory() as workbooks_dir:
+            with open(os.path.join(workbooks_dir, "sample.twb"), 'w') as f:
+                f.write(SAMPLE_WORKBOOK)
+            self.assertEqual(list(rows[0].keys()), list(tableau.get_all_workbook_fields(workbooks_dir).columns))
+
+    def test_refresh_extracts_resolves_names_on_server(self):
+        class FakeEndpoint:
+            def __init__(self, item_class, names):
+                self.items = [item_class('project_id', name=name) for name in names]
+                for item in self.items:
+                    item._id = item.name
+                self.filters = list()
+                self.refresh = mock.Mock(return_value=None)
+
+            def get(self, req_options=None):
+                if not req_options.filter:
+                    self.filters.append('')
+                    return self.items, SimpleNamespace(page_number=1, page_size=100, total_available=len(self.items))
+                name_filter = list(req_options.filter)[0]
+                self.filters.append(str(name_filter))
+                names = name_filter.value if isinstance(name_filter.value, list) else [name_filter.value]
+                items = [item for item in self.items if item.name in names]
+                return items, SimpleNamespace(page_number=1, page_size=100, total_available=len(items))
+
+        tableau = PyTableau.__new__(PyTableau)
+        tableau.server = SimpleNamespace(server_address='server',
+                                         datasources=FakeEndpoint(TSC.DatasourceItem, ['ds1', 'ds2', 'ds,3']),
+                                         workbooks=FakeEndpoint(TSC.WorkbookItem, ['wb1']))
+        tableau.refresh_extracts(['ds1', 'wb1', 'ds,3'])
+        self.assertEqual(sorted(tableau.server.datasources.filters), ['name:eq:ds,3', 'name:in:[ds1,wb1]'])
+        self.assertEqual([call.args[0].name for call in tableau.server.datasources.refresh.call_args_list],
+                         ['ds1', 'ds,3'])
+        self.assertEqual([call.args[0].name for call in tableau.server.workbooks.refresh.call_args_list], ['wb1'])
+
+        # names are matched case insensitive, names missed by the exact server filters are looked up in all items
+        tableau.server.datasources.filters.clear()
+        self.assertEqual([item.name for item in tableau.get_items_by_names(['DS2', 'wb1'])], ['wb1', 'ds2'])
+        self.assertEqual(tableau.server.datasources.filters, ['name:in:[DS2,wb1]', ''])
+
+
+class TestPyTableauReportScheduler(TestCase):
+
+    def _scheduler(self, workbooks, mailer=None):
+        tableau = mock.Mock()
+        tableau.get_workbooks_by_tag.return_value = workbooks
+
+        def download_workbook(file_type, workbook, dest_dir, **kwargs):
+            wb_file = os.path.join(dest_dir, "%s.%s" % (workbook.name, file_type))
+            with open(wb_file, 'w') as f:
+                f.write(workbook.name)
+            return wb_file
+
+        tableau.download_workbook.side_effect = download_workbook
+        return PyTableauReportScheduler(tableau=tableau, smtp_server=mock.Mock(), schedule_tag='scheduledReport',
+                                        mailer=mailer)
+
+    def test_send_scheduled_reports_renders_workbook_once(self):
+        wb = SimpleNamespace(id='1', name='wb1', tags={'scheduledReport', 'Daily:to:user1@mail.com',
+                                                       'Weekly%s:to:user2@mail.com' % datetime.now().isoweekday()})
+        scheduler = self._scheduler([wb])
+        scheduler.send_scheduled_reports(send_from='reports@mail.com')
+        self.assertEqual(scheduler.tableau.download_workbook.call_count, 1)
+        self.assertEqual(scheduler.smtp_server.send_message.call_count, 2)
+
+    def test_send_scheduled_reports_lists_workbooks_once(self):
+        wb1 = SimpleNamespace(id='1', name='wb1', tags={'Daily:to:user1@mail.com', 'Daily:cc:user2@mail.com'})
+        wb2 = SimpleNamespace(id='2', name='wb2', tags={'Monthly%s:to:user3@mail.com' % datetime.now().day,
+                                                        'Monthly%s:cc:user4@mail.com' % (datetime.now().day % 28 + 1)})
+        scheduler = self._scheduler([wb1, wb2])
+        plan = scheduler._plan_reports(schedules=[scheduler.dailySchedules, scheduler.weeklySchedules,
+                                                  scheduler.monthlySchedules])
+        self.assertEqual(scheduler.tableau.get_workbooks_by_tag.call_count, 1)
+        self.assertEqual([(report['wb'].name, report['to'], report['cc']) for report in plan],
+                         [('wb1', ['user1@mail.com'], ['user2@mail.com']), ('wb2', ['user3@mail.com'], [])])
+
+    def test_send_scheduled_reports_with_mailer(self):
+        outbox = list()
+        connections = list()
+
+        def smtp_factory():
+            connections.append(PyTableauSmtpStub(user='reports@mail.com', fail_after=1, outbox=outbox))
+            return connections[-1]
+
+        wb1 = SimpleNamespace(id='1', name='wb1', tags={'Daily:to:user1@mail.com'})
+        wb2 = SimpleNamespace(id='2', name='wb2', tags={'Daily:to:user2@mail.com', 'Daily:cc:user3@mail.com'})
+        mailer = PyTableauMailer(smtp_factory, pool_size=1, retry_wait=0)
+        with self._scheduler([wb1, wb2], mailer=mailer) as scheduler:
+            scheduler.send_schedule(send_from='reports@mail.com', schedule='Daily')
+        # a given mailer is shared, it is not closed with the scheduler
+        mailer.send(MIMEText('after'), from_addr='reports@mail.com', to_addrs=['user1@mail.com'])
+        mailer.close()
+        self.assertEqual(len(connections), 3)
+        self.assertTrue(all(smtp.closed for smtp in connections))
+        self.assertEqual(sorted(tuple(email['to_addrs']) for email in outbox),
+                         [('user1@mail.com',), ('user1@mail.com',), ('user2@mail.com', 'user3@mail.com')])
+        self.assertEqual(scheduler.smtp_server.send_message.call_count, 0)
+
+
+class TestPyTableauJobTracker(TestCase):
+
+    def test_as_completed_yields_finished_jobs_first(self):
+        polls = {'short': 1, 'long': 3}
+
+        def get_by_id(job_id):
+            polls[job_id] -= 1
+            return SimpleNamespace(id=job_id, finish_code=0, completed_at=(1 if polls[job_id] <= 0 else None))
+
+        tracker = PyTableauJobTracker(server=SimpleNamespace(jobs=SimpleNamespace(get_by_id=get_by_id)),
+                                      min_interval=0, max_interval=0)
+        jobs = {'long': SimpleNamespace(id='long'), 'short': SimpleNamespace(id='short')}
+        self.assertEqual([key for key, job in tracker.as_completed(jobs)], ['short', 'long'])
+
+    def test_wait_timeout(self):
+        get_by_id = lambda job_id: SimpleNamespace(id=job_id, completed_at=None)
+        tracker = PyTableauJobTracker(server=SimpleNamespace(jobs=SimpleNamespace(get_by_id=get_by_id)),
+                                      min_interval=0.01, max_interval=0.01)
+        with self.assertRaises(TimeoutError):
+            tracker.wait({'job': SimpleNamespace(id='job')}, timeout=0.05)
+
+
+class TestPyTableauRefreshScheduler(TestCase):
+
+    def test_run_limits_jobs_in_flight(self):
+        running = dict()
+        finished = list()
+        max_running = list()
+
+        def refresh(item):
+            running[item.id] = 2
+            max_running.append(len(running))
+            return SimpleNamespace(id=item.id)
+
+        def get_by_id(job_id):
+            running[job_id] -= 1
+            if running[job_id] > 0:
+                return SimpleNamespace(id=job_id, completed_at=None)
+            running.pop(job_id)
+            return SimpleNamespace(id=job_id, finish_code=0, completed_at=1)
+
+        def get_jobs(req_options=None):
+            self.assertEqual(str(list(req_options.filter)[0]), 'status:eq:InProgress')
+            return [], SimpleNamespace(total_available=len(running) + 1)
+
+        tableau = PyTableau.__new__(PyTableau)
+        tableau.server = SimpleNamespace(datasources=SimpleNamespace(refresh=refresh),
+                                         jobs=SimpleNamespace(get_by_id=get_by_id, get=get_jobs))
+        items = [TSC.DatasourceItem('project_id', name='ds%s' % i) for i in range(5)]
+        for item in items:
+            item._id = item.name
+        tracker = PyTableauJobTracker(server=tableau.server, min_interval=0, max_interval=0)
+        scheduler = PyTableauRefreshScheduler(tableau, max_in_flight=3, max_server_jobs=3, job_tracker=tracker)
+        completed, failed = scheduler.run(items, on_complete=lambda key, job: finished.append(key))
+        self.assertEqual(sorted(finished), ['ds%s:ds%s' % (i, i) for i in range(5)])
+        self.assertEqual(sorted(completed.keys()), sorted(finished))
+        self.assertEqual(failed, {})
+        self.assertEqual(max(max_running), 2)
+
+    def test_run_dependencies(self):
+        submitted = list()
+        finished = list()
+
+        def refresh(item):
+            submitted.append((item.name, sorted(finished)))
+            return SimpleNamespace(id=item.id)
+
+        def get_by_id(job_id):
+            finished.append(job_id)
+            return SimpleNamespace(id=job_id, finish_code=(1 if job_id == 'ds2' else 0), completed_at=1)
+
+        def populate_connections(wb):
+            wb._set_connections(lambda: [SimpleNamespace(connection_type='sqlproxy',
+                                                         datasource_name=wb.name.replace('wb', 'ds'))])
+
+        tableau = PyTableau.__new__(PyTableau)
+        tableau.server = SimpleNamespace(datasources=SimpleNamespace(refresh=refresh),
+                                         workbooks=SimpleNamespace(refresh=refresh,
+                                                                   populate_connections=populate_connections),
+                                         jobs=SimpleNamespace(get_by_id=get_by_id))
+        items = [TSC.WorkbookItem('project_id', name=name) for name in ('wb1', 'wb2')] + \
+                [TSC.DatasourceItem('project_id', name=name) for name in ('ds1', 'ds2', 'ds3')]
+        for item in items:
+            item._id = item.name
+        tracker = PyTableauJobTracker(server=tableau.server, min_interval=0, max_interval=0)
+        scheduler = PyTableauRefreshScheduler(tableau, max_in_flight=4, job_tracker=tracker)
+        dependencies = scheduler.discover_dependencies(items)
+        self.assertEqual(dependencies, {'wb1': ['ds1'], 'wb2': ['ds2']})
+        completed, failed = scheduler.run(items, dependencies=dependencies)
+        self.assertEqual([name for name, _ in submitted], ['ds1', 'ds2', 'ds3', 'wb1'])
+        self.assertIn('ds1', submitted[-1][1])
+        self.assertEqual(sorted(completed.keys()), ['ds1:ds1', 'ds2:ds2', 'ds3:ds3', 'wb1:wb1'])
+        self.assertEqual(failed, {'wb2': 'upstream ds2 failed'})
+        with self.assertRaises(Exception):
+            scheduler.run(items, dependencies={'ds1': ['wb1'], 'wb1': ['ds1']})
+
+    def test_run_same_named_dependencies(self):
+        submitted = list()
+        finished = list()
+
+        def refresh(item):
+            submitted.append((item.id, list(finished)))
+            return SimpleNamespace(id=item.id)
+
+        def get_by_id(job_id):
+            finished.append(job_id)
+            return SimpleNamespace(id=job_id, finish_code=0, completed_at=1)
+
+        def populate_connections(wb):
+            wb._set_connections(lambda: [SimpleNamespace(connection_type='sqlproxy', datasource_name='Sales')])
+
+        tableau = PyTableau.__new__(PyTableau)
+        tableau.server = SimpleNamespace(datasources=SimpleNamespace(refresh=refresh),
+                                         workbooks=SimpleNamespace(refresh=refresh,
+                                                                   populate_connections=populate_connections),
+                                         jobs=SimpleNamespace(get_by_id=get_by_id))
+        # a workbook built on the published datasource of the same name, and a same named datasource of another
+        # project nothing depends on
+        items = [TSC.WorkbookItem('p1', name='Sales'), TSC.DatasourceItem('p1', name='Sales'),
+                 TSC.DatasourceItem('p2', name='Orders')]
+        for item, item_id in zip(items, ('wb', 'ds', 'other')):
+            item._id = item_id
+        tracker = PyTableauJobTracker(server=tableau.server, min_interval=0, max_interval=0)
+        scheduler = PyTableauRefreshScheduler(tableau, max_in_flight=4, job_tracker=tracker)
+        dependencies = scheduler.discover_dependencies(items)
+        self.assertEqual(dependencies, {'wb': ['Sales']})
+        completed, failed = scheduler.run(items, dependencies=dependencies)
+        self.assertEqual(failed, {})
+        self.assertEqual([item_id for item_id, _ in submitted], ['ds', 'other', 'wb'])
+        self.assertIn('ds', submitted[-1][1])
+        # names work as well
+        submitted.clear()
+        finished.clear()
+        scheduler.run(items, dependencies={'sales': ['SALES']})
+        self.assertEqual([item_id for item_id, _ in submitted], ['ds', 'other', 'wb'])
+        self.assertIn('ds', submitted[-1][1])
+
+
+class TestAsyncPyTableau(TestCase):
+
+    def test_concurrency_is_limited(self):
+        running = {'current': 0, 'max': 0}
+        lock = threading.Lock()
+
+        def get_workbook_by_name(name, **kwargs):
+            with lock:
+                running['current'] += 1
+                running['max'] = max(running['max'], running['current'])
+            time.sleep(0.02)
+            with lock:
+                running['current'] -= 1
+            return name
+
+        tableau = mock.Mock()
+        tableau.get_workbook_by_name.side_effect = get_workbook_by_name
+        async_tableau = AsyncPyTableau(tableau=tableau, max_concurrency=3)
+
+        async def lookup_all():
+            return await asyncio.gather(*[async_tableau.get_workbook_by_name("wb%s" % i) for i in range(10)])
+
+        self.assertEqual(asyncio.run(lookup_all()), ["wb%s" % i for i in range(10)])
+        self.assertEqual(running['max'], 3)
+        tableau.set_http_pool_size.assert_called_once_with(3)
+
+
+class TestPyTableauUtils(TestCase):
+
+    def test_require(self):
+        self.assertIs(PyTableauUtils._require('PIL.Image', 'Pillow'), Image)
+        with self.assertRaisesRegex(Exception, r'Please `pip install missing-package` to export pdf'):
+            PyTableauUtils._require('missing_module', 'missing-package', purpose='export pdf')
+
+    def test_iter_csv_rows_across_chunks(self):
+        content = '﻿name,comment\nfoo,"multi\nline"\nbär,baz\n'.encode('utf-8')
+        chunks = [content[i:i + 3] for i in range(0, len(content), 3)]
+        self.assertEqual(list(PyTableauUtils.iter_csv_rows(chunks)),
+                         [['name', 'comment'], ['foo', 'multi\nline'], ['bär', 'baz']])
+
+    def test_write_bundles(self):
+        sheets = [('view1', [b'a,b\n1,2\n']), ('view2', [b'c\n3\n'])]
+        with tempfile.TemporaryDirectory() as dest_dir:
+            xlsx_file = os.path.join(dest_dir, 'wb.xlsx')
+            self.assertEqual(PyTableauUtils.write_xlsx(xlsx_file, iter(sheets)), 2)
+            self.assertEqual([ws.title for ws in load_workbook(xlsx_file).worksheets], ['view1', 'view2'])
+
+            csv_gz_file = os.path.join(dest_dir, 'wb.csv.zip')
+            self.assertEqual(PyTableauUtils.write_csv_gz_bundle(csv_gz_file, iter(sheets)), 2)
+            with zipfile.ZipFile(csv_gz_file) as bundle:
+                self.assertEqual(gzip.decompress(bundle.read('view1.csv.gz')), b'a,b\n1,2\n')
+
+            parquet_file = os.path.join(dest_dir, 'wb.parquet.zip')
+            sheets = [('view1', [b'a,a,a_1,a\n1,2,3,4\n'])]
+            self.assertEqual(PyTableauUtils.write_parquet_bundle(parquet_file, iter(sheets)), 1)
+            with zipfile.ZipFile(parquet_file) as bundle:
+                table = pyarrow.parquet.read_table(io.BytesIO(bundle.read('view1.parquet')))
+            self.assertEqual(table.column_names, ['a', 'a_2', 'a_1', 'a_3'])
+            self.assertEqual(table.to_pylist(), [{'a': '1', 'a_2': '2', 'a_1': '3', 'a_3': '4'}])
+
+
+class TestPyTableauMetrics(TestCase):
+
+    def test_timer_spans_and_prometheus(self):
+        metrics = PyTableauMetrics(buckets=(0.1, 1))
+        spans = list()
+        metrics.add_span_hook(lambda name, labels: mock.MagicMock(__enter__=lambda _: spans.append((name, labels))))
+        with metrics.timer('render', file_type='pdf'):
+            pass
+        with self.assertRaises(ValueError):
+            with metrics.timer('email'):
+                raise ValueError()
+        self.assertEqual(spans, [('pytableau.render', {'file_type': 'pdf'}), ('pytableau.email', {})])
+        self.assertEqual(metrics.value('pytableau_stage_seconds', stage='render', file_type='pdf')[0], 1)
+        self.assertEqual(metrics.value('pytableau_stage_errors_total', stage='email'), 1)
+        text = metrics.to_prometheus()
+        self.assertIn('# TYPE pytableau_stage_seconds histogram', text)
+        self.assertIn('pytableau_stage_seconds_bucket{file_type="pdf",stage="render",le="0.1"} 1', text)
+        self.assertIn('pytableau_stage_seconds_count{stage="email"} 1', text)
+
+    def test_instrument_session(self):
+        metrics = PyTableauMetrics()
+        session = requests.Session()
+        metrics.instrument_session(session)
+        metrics.instrument_session(session)
+        self.assertEqual(len(session.hooks['response']), 1)
+
+        response = requests.Response()
+        response.status_code = 200
+        response.headers['Content-Length'] = '10'
+        response.elapsed = timedelta(seconds=0.5)
+        response.request = requests.Request(
+            'GET', 'http://server/api/3.4/sites/site-id/views/9fe2c9b4-6e3e-4f2c-a3d4-0f6e1a2b3c4d/pdf').prepare()
+        session.hooks['response'][0](response)
+        response.request = requests.Request('GET', 'http://server/api/3.4/sites/site-id/views/'
+                                                   '1fe2c9b4-6e3e-4f2c-a3d4-0f6e1a2b3c4d/pdf').prepare()
+        session.hooks['response'][0](response)
+        labels = {'method': 'GET', 'endpoint': '/sites/{site}/views/{id}/pdf'}
+        self.assertEqual(metrics.value('pytableau_http_request_seconds', **labels), (2, 1.0))
+        self.assertEqual(metrics.value('pytableau_http_response_bytes_total', **labels), 20)
+        self.assertEqual(metrics.value('pytableau_http_requests_total', status=200, **labels), 2)
+
+        # chunked response without Content-Length is counted as its content is read
+        response = requests.Response()
+        response.status_code = 200
+        response.elapsed = timedelta(seconds=0.1)
+        response.raw = io.BytesIO(b'x' * 2500)
+        response.request = requests.Request('GET', 'http://server/api/3.4/sites/site-id/workbooks/'
+                                                   '1fe2c9b4-6e3e-4f2c-a3d4-0f6e1a2b3c4d/content').prepare()
+        session.hooks['response'][0](response)
+        self.assertEqual(sum(len(chunk) for chunk in response.iter_content(1024)), 2500)
+        self.assertEqual(metrics.value('pytableau_http_response_bytes_total', method='GET',
+                                       endpoint='/sites/{site}/workbooks/{id}/content'), 2500)
+
+
+class TestPyTableauPdfWriter(TestCase):
+
+    @staticmethod
+    def _pdf(colors, size):
+        pdf_content = io.BytesIO()
+        images = [Image.new('RGB', size, color=color) for color in colors]
+        images[0].save(pdf_content, 'PDF', save_all=True, append_images=images[1:])
+        return pdf_content.getvalue()
+
+    def test_append(self):
+        with tempfile.TemporaryDirectory() as dest_dir:
+            pdf_file = os.path.join(dest_dir, 'wb.pdf')
+            with PyTableauPdfWriter(pdf_file) as pdf_writer:
+                pdf_writer.append(self._pdf(['red', 'green'], (100, 50)))
+                pdf_writer.append(self._pdf(['blue'], (30, 40)))
+            self.assertEqual(pdf_writer.num_pages, 3)
+            with open(pdf_file, 'rb') as f:
+                reader = PyPDF3.PdfFileReader(f, strict=True)
+                self.assertEqual([reader.getPage(i).mediaBox.upperRight for i in range(reader.numPages)],
+                                 [(100, 50), (100, 50), (30, 40)])
+            with open(pdf_file, 'rb') as f:
+                # only the page tree of the output document, not the ones of the appended documents
+                self.assertEqual(len(re.findall(rb'/Type\s*/Pages\b', f.read())), 1)
+
+
+class FakeConnectionEndpoint():
+
+    def __init__(self, resources):
+        self.resources = resources
+        self.updated = list()
+
+    def get(self, req_options=None):
+        return list(self.resources.values()), SimpleNamespace(page_number=1, page_size=100,
+                                                             total_available=len(self.resources))
+
+    def populate_connections(self, resource):
+        if getattr(resource, 'fail_populate', False):
+            raise Exception("populate failed")
+        resource.connections = resource._connections
+
+    def update_connection(self, resource, conn):
+        if conn.id == 'fail':
+            raise Exception("update failed")
+        self.updated.append((resource.id, conn.id, conn.server_address))
+
+
+class TestPyTableauConnectionMigration(TestCase):
+
+    def _tableau(self):
+        connections = [SimpleNamespace(id='c1', server_address='old-db', username='user'),
+                       SimpleNamespace(id='c2', server_address='other-db', username='user'),
+                       SimpleNamespace(id='fail', server_address='old-db', username='user')]
+        resources = {'ds1': SimpleNamespace(id='ds1', name='ds1', _connections=connections[:2]),
+                     'ds2': SimpleNamespace(id='ds2', name='ds2', _connections=connections[2:])}
+        tableau = PyTableau.__new__(PyTableau)
+        tableau.server = SimpleNamespace(server_address='server', datasources=FakeConnectionEndpoint(resources))
+        return tableau
+
+    def test_dry_run_and_resume(self):
+        tableau = self._tableau()
+        with tempfile.TemporaryDirectory() as checkpoint_dir, mock.patch('pytableau.time.sleep'):
+            checkpoint_file = os.path.join(checkpoint_dir, 'checkpoint')
+            plan = tableau.update_all_datasource_connections('old-db', 'user', new_server_address='new-db',
+                                                             checkpoint_file=checkpoint_file, dry_run=True)
+            self.assertEqual([change['connection'].id for change in plan], ['c1', 'fail'])
+            self.assertEqual(tableau.server.datasources.updated, [])
+
+            summary = tableau.update_all_datasource_connections('old-db', 'user', new_server_address='new-db',
+                                                                max_workers=4, checkpoint_file=checkpoint_file)
+            self.assertEqual(summary['updated'], 1)
+            self.assertEqual(list(summary['failed'].keys()), ['datasource:ds2:fail'])
+            self.assertEqual(tableau.server.datasources.updated, [('ds1', 'c1', 'new-db')])
+
+            tableau = self._tableau()
+            plan = tableau.update_all_datasource_connections('old-db', 'user', new_server_address='new-db',
+                                                             checkpoint_file=checkpoint_file, dry_run=True)
+            self.assertEqual([change['connection'].id for change in plan], ['fail'])
+
+    def test_scan_failures_are_reported(self):
+        index = PyTableauConnectionIndex()
+        for item_id in ('ds1', 'ds2', 'ds3', 'missing'):
+            index._add({'content_type': 'datasource', 'id': item_id, 'name': item_id, 'project_name': 'p',
+                        'updated_at': 't1', 'connections': [{'server_address': 'old-db', 'username': 'USER'}]})
+
+        for migration_index, failed in ((None, ['ds2']), (index, ['ds2', 'missing'])):
+            tableau = self._tableau()
+            resources = tableau.server.datasources.resources
+            resources['ds1']._connections[0].server_address = 'OLD-DB'
+            resources['ds2'].fail_populate = True
+            resources['ds3'] = SimpleNamespace(id='ds3', name='ds3', _connections=list())
+            tableau.server.datasources.get_by_id = lambda item_id: resources[item_id]
+            migration = PyTableauConnectionMigration(tableau, 'old-db', 'user', new_server_address='new-db',
+                                                     retry_attempt=1, index=migration_index)
+            plan = migration.run(content_types=['datasource'], dry_run=True)
+            self.assertEqual([change['connection'].id for change in plan if change['connection']], ['c1'])
+            self.assertEqual(sorted(change['resource_id'] for change in plan if change.get('error')), failed)
+            summary = migration.apply(plan)
+            self.assertEqual(summary['updated'], 1)
+            self.assertEqual(sorted(summary['failed'].keys()), ['datasource:%s' % item_id for item_id in failed])
+
+
+class TestPyTableauCatalog(TestCase):
+
+    def test_lookups_are_served_from_catalog(self):
+        class FakeEndpoint:
+            def __init__(self, items):
+                self.items = items
+                self.requests = list()
+
+            def get(self, req_options=None):
+                self.requests.append([str(f) for f in req_options.filter])
+                items = [item for item in self.items
+                         if not req_options.filter or item.updated_at >= datetime(2020, 1, 2)]
+                return items, SimpleNamespace(page_number=1, page_size=100, total_available=len(items))
+
+        workbooks = [SimpleNamespace(id=str(i), name='wb%s' % i, project_name='p', tags={'report'} if i else set(),
+                                     updated_at=datetime(2020, 1, 1)) for i in range(3)]
+        projects = [SimpleNamespace(id='p1', name='p', parent_id=None),
+                    SimpleNamespace(id='p2', name='c', parent_id='p1')]
+        tableau = PyTableau.__new__(PyTableau)
+        tableau.server = SimpleNamespace(workbooks=FakeEndpoint(workbooks), datasources=FakeEndpoint([]),
+                                         projects=FakeEndpoint(projects))
+        catalog = tableau.use_catalog(ttl=None)
+        self.assertEqual(tableau.get_workbook_by_name('wb1', project_name='p').id, '1')
+        self.assertEqual(tableau.get_workbook_by_name('wb2').id, '2')
+        self.assertEqual(tableau.get_workbook_by_name('WB2').id, '2')
+        self.assertEqual(tableau.get_project_by_name('C', parant_project_name='P').id, 'p2')
+        self.assertEqual([wb.id for wb in tableau.get_workbooks_by_tag('report')], ['1', '2'])
+        self.assertEqual([item.id for item in tableau.get_items_by_names(['WB1', 'wb2'])], ['1', '2'])
+        self.assertEqual(tableau.get_project_by_name('c', parant_project_name='p').id, 'p2')
+        with self.assertRaises(LookupError):
+            tableau.get_datasource_by_name('wb1')
+        self.assertEqual(len(tableau.server.workbooks.requests), 1)
+        self.assertEqual(len(tableau.server.projects.requests), 1)
+
+        # expired catalog is updated by updated_at
+        workbooks[0] = SimpleNamespace(id='0', name='renamed', project_name='p', tags=set(),
+                                       updated_at=datetime(2020, 1, 2))
+        catalog.ttl = 0
+        self.assertEqual(tableau.get_workbook_by_name('renamed').id, '0')
+        self.assertEqual(tableau.server.workbooks.requests[1], ['updatedAt:gte:2020-01-01T00:00:00Z'])
+
+
+class TestPyTableauConnectionIndex(TestCase):
+
+    def test_refresh_and_find(self):
+        def connection(conn_id, server_address, username):
+            return SimpleNamespace(id=conn_id, server_address=server_address, server_port='5432', username=username,
+                                   connection_type='postgres')
+
+        resources = {'ds1': SimpleNamespace(id='ds1', name='ds1', project_name='p', updated_at='t1',
+                                            _connections=[connection('c1', 'DB-Host', 'user')]),
+                     'ds2': SimpleNamespace(id='ds2', name='ds2', project_name='p', updated_at='t1',
+                                            _connections=[connection('c2', 'db-host', 'admin')])}
+        endpoint = FakeConnectionEndpoint(resources)
+        tableau = PyTableau.__new__(PyTableau)
+        tableau.server = SimpleNamespace(datasources=endpoint)
+
+        with tempfile.TemporaryDirectory() as index_dir:
+            index_file = os.path.join(index_dir, 'connections.json')
+            index = PyTableauConnectionIndex(index_file=index_file)
+            index.refresh(tableau, content_types=['datasource'])
+            self.assertEqual([item['id'] for item in index.find(server_address='db-host')], ['ds1', 'ds2'])
+            self.assertEqual([item['id'] for item in index.find('db-host', '5432', 'user', 'postgres')], ['ds1'])
+
+            resources.pop('ds1')
+            resources['ds2'].updated_at = 't2'
+            resources['ds2']._connections = [connection('c2', 'new-host', 'admin')]
+            index = PyTableauConnectionIndex(index_file=index_file)
+            summary = index.refresh(tableau, content_types=['datasource'])
+            self.assertEqual(summary, {'scanned': 1, 'unchanged': 0, 'removed': 1, 'failed': 0})
+            self.assertEqual(index.find(server_address='db-host'), [])
+            self.assertEqual([item['id'] for item in index.find(server_address='new-host', username='admin')],
+                             ['ds2'])
+
+    def test_failed_scan_is_retried(self):
+        connection = SimpleNamespace(id='c1', server_address='db', server_port='', username='user',
+                                     connection_type='postgres')
+        resources = {'ds1': SimpleNamespace(id='ds1', name='ds1', project_name='p', updated_at='t1',
+                                            fail_populate=True, _connections=[connection])}
+        tableau = PyTableau.__new__(PyTableau)
+        tableau.server = SimpleNamespace(datasources=FakeConnectionEndpoint(resources))
+        index = PyTableauConnectionIndex()
+        self.assertEqual(index.refresh(tableau, content_types=['datasource']),
+                         {'scanned': 0, 'unchanged': 0, 'removed': 0, 'failed': 1})
+        self.assertEqual(index.find(server_address='db'), [])
+
+        resources['ds1'].fail_populate = False
+        self.assertEqual(index.refresh(tableau, content_types=['datasource']),
+                         {'scanned': 1, 'unchanged': 0, 'removed': 0, 'failed': 0})
+        self.assertEqual([item['id'] for item in index.find(server_address='db')], ['ds1'])
+
+        # a failing rescan keeps the previous connections and is scanned again on the next refresh
+        resources['ds1'].updated_at = 't2'
+        resources['ds1'].fail_populate = True
+        self.assertEqual(index.refresh(tableau, content_types=['datasource'])['failed'], 1)
+        self.assertEqual([item['id'] for item in index.find(server_address='db')], ['ds1'])
+        resources['ds1'].fail_populate = False
+        self.assertEqual(index.refresh(tableau, content_types=['datasource'])['scanned'], 1)
+
+
+class TestPyTableauSession(TestCase):
+
+    class FakeAdapter(requests.adapters.BaseAdapter):
+        """ signs in with a new token each time, other calls fail with 401 unless they use the current token """
+
+        def __init__(self):
+            super().__init__()
+            self.tokens = list()
+            self.calls = list()
+
+        def send(self, request, **kwargs):
+            response = requests.Response()
+            response.request = request
+            response.url = request.url
+            response.status_code = 200
+            self.calls.append((request.url.rsplit('/', 1)[-1], request.headers.get('X-Tableau-Auth')))
+            if request.url.endswith('/auth/signin'):
+                self.tokens.append('token%s' % len(self.tokens))
+                body = '<credentials token="%s"><site id="site" contentUrl=""/><user id="user"/></credentials>' % \
+                       self.tokens[-1]
+            elif request.headers.get('X-Tableau-Auth') != self.tokens[-1]:
+                response.status_code = 401
+                body = '<error code="401002"><summary>Unauthorized Access</summary></error>'
+            else:
+                body = '<pagination pageNumber="1" pageSize="100" totalAvailable="0"/><workbooks/>'
+            response._content = ('<tsResponse xmlns="http://tableau.com/api">%s</tsResponse>' % body).encode()
+            response._content_consumed = True
+            return response
+
+        def close(self):
+            pass
+
+    def test_token_cache_and_sign_in_again(self):
+        adapter = self.FakeAdapter()
+        with tempfile.TemporaryDirectory() as cache_dir, \
+                mock.patch.object(requests.Session, 'get_adapter', return_value=adapter):
+            cache_file = os.path.join(cache_dir, 'tokens.json')
+            tableau = PyTableau('http://server', 'user', 'password', '', use_server_version=False,
+                                token_cache_file=cache_file)
+            self.assertEqual(os.stat(cache_file).st_mode & 0o777, 0o600)
+            # second process reuses the cached token
+            other = PyTableau('http://server', 'user', 'password', '', use_server_version=False,
+                              token_cache_file=cache_file)
+            self.assertEqual(other.server.auth_token, 'token0')
+            self.assertEqual(len(adapter.tokens), 1)
+
+            # token expired on the server
+            adapter.tokens.append('expired')
+            self.assertEqual(tableau.server.workbooks.get()[0], [])
+            self.assertEqual(adapter.calls[-3:], [('workbooks', 'token0'), ('signin', None),
+                                                  ('workbooks', 'token2')])
+            self.assertEqual(PyTableauUtils.read_json(cache_file)['http://server||user']['auth_token'], 'token2')
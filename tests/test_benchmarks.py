@@ -0,0 +1,16 @@
+from unittest import TestCase
+
+from benchmarks.mock_server import MockTableauServer
+from benchmarks.run import run
+
+
+class TestBenchmarks(TestCase):
+
+    def test_run_against_mock_server(self):
+        with MockTableauServer(workbooks=3, datasources=2, views_per_workbook=1, csv_rows=10, fields=2,
+                               png_size=(10, 10), job_duration=0.2, scheduled_workbooks=1) as server:
+            results = run(server, cases=['list_workbooks', 'refresh_extracts'], repeat=1, poll_interval=0.05)
+        self.assertEqual([result['case'] for result in results], ['list_workbooks', 'refresh_extracts'])
+        self.assertTrue(all(result['requests'] > 0 for result in results))
+        # refresh is timed by the job duration, not by the default 5 seconds polling interval
+        self.assertLess(results[1]['median'], 2)